@@ -0,0 +1,12 @@
+import pytest
+
+from smUtils.classifMetrics import get_confusion_matrix
+
+from conftest import PREDICTION_COUNTS, make_predictions
+
+
+@pytest.mark.parametrize('with_scores', [False, True])
+@pytest.mark.parametrize('count', PREDICTION_COUNTS)
+def bench_get_confusion_matrix(benchmark, count, with_scores):
+    y_true, y_pred, scores, labels = make_predictions(count)
+    benchmark(get_confusion_matrix, y_true, y_pred, scores if with_scores else None, labels)
@@ -0,0 +1,11 @@
+import pytest
+
+from smUtils.smUtils import protobuf_to_numpy_mask
+
+from conftest import MASK_SIZES, make_mask, make_protobuf_mask
+
+
+@pytest.mark.parametrize('size', MASK_SIZES)
+def bench_protobuf_to_numpy_mask(benchmark, size):
+    payload = make_protobuf_mask(make_mask(size, 8))
+    benchmark(protobuf_to_numpy_mask, payload)
@@ -0,0 +1,36 @@
+import pytest
+
+from smUtils.s3Utils import delete_folder_in_s3, download_s3_folder, list_s3_objects, upload_s3_folder
+
+from conftest import OBJECT_COUNTS, populate_bucket, populate_folder
+
+
+@pytest.mark.parametrize('count', OBJECT_COUNTS)
+def bench_list_s3_objects(benchmark, s3_client, count):
+    s3_uri = populate_bucket(s3_client, count)
+    benchmark(list_s3_objects, s3_client, s3_uri)
+
+
+@pytest.mark.parametrize('count', OBJECT_COUNTS)
+def bench_download_s3_folder(benchmark, s3_client, tmp_path, count):
+    s3_uri = populate_bucket(s3_client, count)
+    benchmark.pedantic(download_s3_folder, args=(s3_client, str(tmp_path), s3_uri), rounds=3)
+
+
+@pytest.mark.parametrize('count', OBJECT_COUNTS)
+def bench_upload_s3_folder(benchmark, s3_client, tmp_path, count):
+    local_dir = populate_folder(tmp_path, count)
+    benchmark.pedantic(
+        upload_s3_folder,
+        args=(s3_client, local_dir, 's3://smutils-bench/upload'),
+        kwargs={'skip_existing': False},
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize('count', OBJECT_COUNTS)
+def bench_delete_folder_in_s3(benchmark, s3_client, count):
+    def setup():
+        return (s3_client, populate_bucket(s3_client, count)), {}
+
+    benchmark.pedantic(delete_folder_in_s3, setup=setup, rounds=3)
@@ -0,0 +1,36 @@
+import pytest
+from PIL import Image
+
+from smUtils.segmentMetrics import get_multiclass_dice, get_multiclass_iou
+from smUtils.segmentUtils import mask_array_to_image, overlay_mask
+
+from conftest import CLASS_COUNTS, MASK_SIZES, make_mask
+
+
+@pytest.mark.parametrize('num_classes', CLASS_COUNTS)
+@pytest.mark.parametrize('size', MASK_SIZES)
+def bench_get_multiclass_iou(benchmark, size, num_classes):
+    y_true = make_mask(size, num_classes, seed=0)
+    y_pred = make_mask(size, num_classes, seed=1)
+    benchmark(get_multiclass_iou, y_true, y_pred)
+
+
+@pytest.mark.parametrize('num_classes', CLASS_COUNTS)
+@pytest.mark.parametrize('size', MASK_SIZES)
+def bench_get_multiclass_dice(benchmark, size, num_classes):
+    y_true = make_mask(size, num_classes, seed=0)
+    y_pred = make_mask(size, num_classes, seed=1)
+    benchmark(get_multiclass_dice, y_true, y_pred)
+
+
+@pytest.mark.parametrize('size', MASK_SIZES)
+def bench_mask_array_to_image(benchmark, size):
+    mask = make_mask(size, 8)
+    benchmark(mask_array_to_image, mask)
+
+
+@pytest.mark.parametrize('size', MASK_SIZES)
+def bench_overlay_mask(benchmark, size):
+    image = Image.fromarray(make_mask(size, 255, block=1)).convert('RGB')
+    segment = mask_array_to_image(make_mask(size, 8))
+    benchmark(overlay_mask, image, segment)
@@ -0,0 +1,87 @@
+"""Benchmarks for smUtils hot paths, run with pytest-benchmark.
+
+    pytest benchmarks                       # run and save to .benchmarks/
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=median:15%
+
+The second form compares against the latest saved run and fails when any
+benchmark's median is more than 15% slower. Saved runs are JSON and can be
+compared across commits with `pytest-benchmark compare`.
+"""
+import os
+
+import numpy as np
+import pytest
+
+
+MASK_SIZES = [256, 1024, 2048]
+CLASS_COUNTS = [2, 8, 32]
+PREDICTION_COUNTS = [1000, 100000]
+OBJECT_COUNTS = [10, 100, 1000]
+
+
+def make_mask(size: int, num_classes: int, block: int = 16, seed: int = 0) -> np.array:
+    """Blocky uint8 class mask, closer to real segment masks than pixel noise"""
+    rng = np.random.default_rng(seed)
+    cells = -(-size // block)
+    coarse = rng.integers(0, num_classes, (cells, cells), dtype=np.uint8)
+    return np.kron(coarse, np.ones((block, block), dtype=np.uint8))[:size, :size]
+
+
+def make_predictions(count: int, num_labels: int = 8, seed: int = 0):
+    """Classification labels, predictions (80% correct) and scores"""
+    rng = np.random.default_rng(seed)
+    labels = [f'class_{i}' for i in range(num_labels)]
+    y_true = rng.integers(0, num_labels, count)
+    y_pred = np.where(rng.random(count) < 0.8, y_true, rng.integers(0, num_labels, count))
+    scores = rng.random(count).round(2)
+    return [labels[i] for i in y_true], [labels[i] for i in y_pred], scores.tolist(), labels
+
+
+def make_protobuf_mask(mask: np.array) -> bytes:
+    """Encodes a mask the way the Sagemaker semantic segmentation endpoint
+    answers with accept type application/x-protobuf"""
+    Record = pytest.importorskip('sagemaker.amazon.record_pb2').Record
+    mx = pytest.importorskip('mxnet')
+    import tempfile
+
+    rec = Record()
+    rec.features['target'].float32_tensor.values.extend(mask.ravel().astype(np.float32).tolist())
+    rec.features['shape'].int32_tensor.values.extend([1, *mask.shape])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'mask.rec')
+        writer = mx.recordio.MXRecordIO(path, 'w')
+        writer.write(rec.SerializeToString())
+        writer.close()
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+@pytest.fixture
+def s3_client():
+    """Client on a moto in-memory s3 with an empty `smutils-bench` bucket"""
+    moto = pytest.importorskip('moto')
+    from smUtils.s3Utils import get_s3_client
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = get_s3_client(max_concurrency=64, session=pytest.importorskip('boto3').session.Session())
+        client.create_bucket(Bucket='smutils-bench')
+        yield client
+
+
+def populate_bucket(s3_client, count: int, size: int = 4096, prefix: str = 'data') -> str:
+    """Uploads `count` objects of `size` bytes and returns their s3 prefix uri"""
+    payload = os.urandom(size)
+    for i in range(count):
+        s3_client.put_object(Bucket='smutils-bench', Key=f'{prefix}/{i % 10}/{i:06d}.png', Body=payload)
+    return f's3://smutils-bench/{prefix}'
+
+
+def populate_folder(path, count: int, size: int = 4096):
+    payload = os.urandom(size)
+    for i in range(count):
+        os.makedirs(os.path.join(path, str(i % 10)), exist_ok=True)
+        with open(os.path.join(path, str(i % 10), f'{i:06d}.png'), 'wb') as f:
+            f.write(payload)
+    return str(path)
@@ -25,5 +25,11 @@ setuptools.setup(
     ],
     packages=['smUtils'],
     package_dir = {'smUtils': 'sm-utils'},
+    entry_points={
+        'console_scripts': [
+            'smutils=smUtils.cli:main',
+            'smutils-bench=smUtils.cli:bench_main',
+        ],
+    },
     python_requires=">=3.6",
 )
@@ -10,4 +10,5 @@ all_dependencies = (
 im_utils_dependencies = ("PIL", "numpy")
 pred_utils_dependencies = ("numpy", "sagemaker", "mxnet")
 metric_utils_dependencies = ("numpy")
-plot_utils_dependencies = ("numpy", "matplotlib", "seaborn")
\ No newline at end of file
+plot_utils_dependencies = ("numpy", "matplotlib", "seaborn")
+async_s3_utils_dependencies = ("aiobotocore",)
@@ -1,5 +1,7 @@
 import requests
 
+from .telemetry import track
+
 def send_request_to_api(DATA, URL, CONTENT_TYPE=None, ACCEPT_TYPE=None, API_KEY=None):
     HEADERS = {}
     if CONTENT_TYPE is not None:
@@ -10,4 +12,12 @@ def send_request_to_api(DATA, URL, CONTENT_TYPE=None, ACCEPT_TYPE=None, API_KEY=
     if API_KEY is not None:
         HEADERS['X-API-Key'] = API_KEY
 
-    return requests.request(method='GET', url=URL, headers=HEADERS, data=DATA)
+    with track('api.request') as event:
+        response = requests.request(method='GET', url=URL, headers=HEADERS, data=DATA)
+        event.requests = 1
+        # Encoded request body; streamed bodies (files, generators) are not counted
+        body = response.request.body
+        event.bytes = (len(body) if isinstance(body, (bytes, str)) else 0) + len(response.content)
+        if not response.ok:
+            event.error = f'HTTP {response.status_code}'
+    return response
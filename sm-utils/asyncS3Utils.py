@@ -0,0 +1,331 @@
+import asyncio
+import os
+from typing import AsyncIterator, List, Sequence, Union
+
+from .s3Utils import (
+    DESTINATION_COMBINATIONS,
+    ORIGIN_COMBINATIONS,
+    S3Location,
+    resolve_s3_object,
+    resolve_s3_prefix,
+)
+from .telemetry import track
+
+
+def get_async_s3_client(
+    max_concurrency: int = 64,
+    region_name: str = None,
+    profile_name: str = None,
+    max_attempts: int = 10,
+    endpoint_url: str = None,
+):
+    """Returns an aiobotocore s3 client context manager sized for
+    `max_concurrency` requests in flight, with adaptive retries.
+
+        async with get_async_s3_client(max_concurrency=256) as s3_client:
+            async for obj in iter_s3_objects(s3_client, 's3://bucket/prefix'):
+                ...
+    """
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+
+    session = get_session()
+    if profile_name:
+        session.set_config_variable('profile', profile_name)
+    config = AioConfig(
+        max_pool_connections=max(int(max_concurrency), 10),
+        retries={'max_attempts': max_attempts, 'mode': 'adaptive'},
+    )
+    return session.create_client('s3', region_name=region_name, endpoint_url=endpoint_url, config=config)
+
+
+async def _bounded(semaphore: asyncio.Semaphore, coroutine):
+    async with semaphore:
+        return await coroutine
+
+
+async def _cancel_all(tasks) -> None:
+    """Cancels `tasks` and waits for them to finish their cleanup"""
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _discard(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def upload_file_to_s3(
+    s3_client,
+    file_bytes: bytes,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    key: str = None,
+    prefix: str = None,
+    filename: str = None,
+) -> None:
+    """Uploads a bytefile object to s3.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and key
+      - bucket_name and prefix and filename
+    """
+    location = resolve_s3_object(s3_uri, bucket_name, key, prefix, filename)
+
+    with track('s3.upload') as event:
+        resp = await s3_client.put_object(Bucket=location.bucket, Key=location.key, Body=file_bytes)
+        event.add_response(resp)
+        event.bytes = len(file_bytes)
+
+
+async def read_file_from_s3(
+    s3_client,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    key: str = None,
+    prefix: str = None,
+    filename: str = None
+) -> bytes:
+    """Reads a file from s3 and returns as bytes object.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and key
+      - bucket_name and prefix and filename
+    """
+    location = resolve_s3_object(s3_uri, bucket_name, key, prefix, filename)
+
+    with track('s3.read') as event:
+        resp = await s3_client.get_object(Bucket=location.bucket, Key=location.key)
+        event.add_response(resp)
+        async with resp['Body'] as stream:
+            file_bytes = await stream.read()
+        event.bytes = len(file_bytes)
+    return file_bytes
+
+
+async def read_files_from_s3(
+    s3_client,
+    s3_uris: Sequence[Union[str, S3Location]],
+    max_concurrency: int = 64,
+) -> List[bytes]:
+    """Reads many files concurrently, at most `max_concurrency` at a time,
+    and returns their bytes in the order of `s3_uris`"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(
+        _bounded(semaphore, read_file_from_s3(s3_client, s3_uri=s3_uri))
+        for s3_uri in s3_uris
+    ))
+
+
+async def copy_file_in_s3(
+    s3_client,
+    org_s3_uri: Union[str, S3Location] = None,
+    org_bucket: str = None,
+    org_key: str = None,
+    org_prefix: str = None,
+    org_filename: str = None,
+    dest_s3_uri: Union[str, S3Location] = None,
+    dest_bucket: str = None,
+    dest_key: str = None,
+    dest_prefix: str = None,
+    dest_filename: str = None
+) -> dict:
+    """Copies a file in s3 to another location in s3.
+
+    Must provide at least one of the following combinations for origin:
+      - org_s3_uri
+      - org_bucket and org_key
+      - org_bucket and org_prefix and org_filename
+    And one of the following combinations for destination:
+      - dest_s3_uri
+      - dest_bucket and dest_key
+      - dest_bucket and dest_prefix and dest_filename
+    """
+    origin = resolve_s3_object(
+        org_s3_uri, org_bucket, org_key, org_prefix, org_filename,
+        error_message=ORIGIN_COMBINATIONS,
+    )
+    destination = resolve_s3_object(
+        dest_s3_uri, dest_bucket, dest_key, dest_prefix, dest_filename,
+        error_message=DESTINATION_COMBINATIONS,
+    )
+
+    copy_source = {'Bucket': origin.bucket, 'Key': origin.key}
+    return await s3_client.copy_object(Bucket=destination.bucket, Key=destination.key, CopySource=copy_source)
+
+
+async def iter_s3_objects(
+    s3_client,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+) -> AsyncIterator[dict]:
+    """Yields the listed objects page by page without holding the full listing.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+
+    paginator = s3_client.get_paginator('list_objects_v2')
+    async for page in paginator.paginate(Bucket=location.bucket, Prefix=location.key):
+        for obj in page.get('Contents', []):
+            yield obj
+
+
+async def list_s3_objects(
+    s3_client,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+) -> List:
+    """Lists files in s3.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+    """
+    with track('s3.list'):
+        return [obj async for obj in iter_s3_objects(s3_client, s3_uri, bucket_name, prefix)]
+
+
+async def delete_folder_in_s3(
+    s3_client,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+    max_concurrency: int = 8,
+):
+    """Deletes a folder in s3, issuing a batch delete per 1000 listed keys
+    while the listing continues.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    success = []
+    errors = []
+    failures = []
+    in_flight = set()
+
+    async def delete_batch(batch):
+        try:
+            resp = await s3_client.delete_objects(Bucket=location.bucket, Delete={'Objects': batch})
+            success.extend(resp.get('Deleted', []))
+            errors.extend(resp.get('Errors', []))
+        except Exception as e:
+            failures.append(e)
+        finally:
+            semaphore.release()
+
+    async def submit(batch):
+        # Only `max_concurrency` batches are held at once, however long the listing
+        await semaphore.acquire()
+        task = asyncio.ensure_future(delete_batch(batch))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    batch = []
+    try:
+        async for obj in iter_s3_objects(s3_client, s3_uri=location):
+            batch.append({'Key': obj['Key']})
+            if len(batch) == 1000:
+                await submit(batch)
+                batch = []
+        if batch:
+            await submit(batch)
+    except BaseException:
+        await _cancel_all(in_flight)
+        raise
+    await asyncio.gather(*in_flight)
+
+    if failures:
+        raise failures[0]
+    return success, errors
+
+
+async def download_s3_folder(
+    s3_client,
+    local_dir,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+    max_concurrency: int = 64,
+    chunk_size: int = 1024 * 1024,
+) -> List:
+    """Downloads s3 folder to local destination.
+
+    Downloads start while the listing is still paging in, at most
+    `max_concurrency` at a time, and bodies are streamed to disk in
+    `chunk_size` pieces so memory stays flat regardless of object sizes.
+    Files are written to a temporary name and renamed once complete, so a
+    failed or cancelled download never leaves a truncated file. File system
+    calls run in the loop's default executor. If the listing fails, the
+    downloads in flight are cancelled before the error is raised.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+
+    Returns
+    -------
+    List of (key, exception) pairs for the objects that failed.
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_event_loop()
+    errors = []
+
+    async def download(obj, event):
+        # File system calls run in the default executor, off the event loop
+        target = os.path.join(local_dir, os.path.relpath(obj['Key'], location.key))
+        part_path = target + '.part'
+        try:
+            await loop.run_in_executor(None, lambda: os.makedirs(os.path.dirname(target), exist_ok=True))
+            resp = await s3_client.get_object(Bucket=location.bucket, Key=obj['Key'])
+            event.add_response(resp)
+            f = await loop.run_in_executor(None, open, part_path, 'wb')
+            try:
+                async with resp['Body'] as stream:
+                    while True:
+                        chunk = await stream.read(chunk_size)
+                        if not chunk:
+                            break
+                        await loop.run_in_executor(None, f.write, chunk)
+                        event.bytes += len(chunk)
+            finally:
+                await loop.run_in_executor(None, f.close)
+            await loop.run_in_executor(None, os.replace, part_path, target)
+        except Exception as e:
+            errors.append((obj['Key'], e))
+        finally:
+            semaphore.release()
+            await loop.run_in_executor(None, _discard, part_path)
+
+    with track('s3.download_folder') as event:
+        # Finished tasks drop out, so at most `max_concurrency` are held however long the listing
+        in_flight = set()
+        try:
+            async for obj in iter_s3_objects(s3_client, s3_uri=location):
+                if obj['Key'][-1] == '/':
+                    continue
+                await semaphore.acquire()
+                task = asyncio.ensure_future(download(obj, event))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        except BaseException:
+            # A failed listing must not leave downloads running after this returns
+            await _cancel_all(in_flight)
+            raise
+        await asyncio.gather(*in_flight)
+        if errors:
+            event.error = f'{len(errors)} failed downloads'
+
+    return errors
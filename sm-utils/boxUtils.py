@@ -0,0 +1,307 @@
+import json
+
+import numpy as np
+
+from typing import Sequence, Tuple, Union
+
+
+class Boxes:
+    """N bounding boxes stored as an (N, 4) float array in xyxy format.
+
+    Optional per-box `scores`, `labels` and `image_ids` arrays travel with
+    the boxes through indexing and concatenation. Iterating yields
+    (x1, y1, x2, y2) tuples, so Boxes can be passed to draw_bounding_box.
+
+    Parameters
+    ----------
+    xyxy : array-like of shape (N, 4),
+        Pixel corners (x1, y1, x2, y2).
+
+    scores : array-like of shape (N,), default None
+
+    labels : array-like of shape (N,), default None
+        Integer class ids.
+
+    image_ids : array-like of shape (N,), default None
+        Integer ids of the image each box belongs to, for evaluating a whole
+        image set at once.
+    """
+    __slots__ = ('xyxy', 'scores', 'labels', 'image_ids')
+
+    def __init__(self, xyxy, scores = None, labels = None, image_ids = None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        self.scores = None if scores is None else np.asarray(scores, dtype=np.float64)
+        self.labels = None if labels is None else np.asarray(labels, dtype=np.int64)
+        self.image_ids = None if image_ids is None else np.asarray(image_ids, dtype=np.int64)
+
+    @classmethod
+    def from_xywh(cls, xywh, **kwargs) -> 'Boxes':
+        """From (x, y, width, height) boxes, e.g. COCO annotations"""
+        xywh = np.asarray(xywh, dtype=np.float64).reshape(-1, 4)
+        return cls(np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1), **kwargs)
+
+    @classmethod
+    def from_normalized(cls, xyxy, image_size: Tuple[int, int], **kwargs) -> 'Boxes':
+        """From xyxy coordinates in 0-1, scaled by the (width, height) image size"""
+        width, height = image_size
+        return cls(np.asarray(xyxy, dtype=np.float64).reshape(-1, 4) * [width, height, width, height], **kwargs)
+
+    @classmethod
+    def from_sagemaker(
+        cls,
+        response: Union[bytes, str, dict],
+        image_size: Tuple[int, int],
+        score_threshold: float = 0.0,
+        image_id: int = None,
+    ) -> 'Boxes':
+        """From a Sagemaker object detection endpoint response.
+
+        Parameters
+        ----------
+        response : bytes, str or dict,
+            JSON body of the form {"prediction": [[class, score, xmin, ymin, xmax, ymax], ...]}
+            with normalized coordinates.
+
+        image_size : (int, int),
+            (width, height) of the image sent to the endpoint.
+
+        score_threshold : float, default 0.0
+            Drop predictions scoring below this.
+
+        image_id : int, default None
+            Id assigned to every box, for building multi-image sets.
+        """
+        if not isinstance(response, dict):
+            response = json.loads(response)
+        predictions = np.asarray(response['prediction'], dtype=np.float64).reshape(-1, 6)
+        predictions = predictions[predictions[:, 1] >= score_threshold]
+        return cls.from_normalized(
+            predictions[:, 2:], image_size,
+            scores=predictions[:, 1],
+            labels=predictions[:, 0].astype(np.int64),
+            image_ids=None if image_id is None else np.full(len(predictions), image_id),
+        )
+
+    @classmethod
+    def concatenate(cls, boxes: Sequence['Boxes']) -> 'Boxes':
+        """Joins several Boxes, e.g. per-image predictions into one image set"""
+        def join(attribute):
+            values = [getattr(b, attribute) for b in boxes]
+            return None if any(v is None for v in values) else np.concatenate(values)
+
+        return cls(
+            np.concatenate([b.xyxy for b in boxes]) if boxes else np.zeros((0, 4)),
+            scores=join('scores') if boxes else None,
+            labels=join('labels') if boxes else None,
+            image_ids=join('image_ids') if boxes else None,
+        )
+
+    def to_xywh(self) -> np.array:
+        return np.concatenate([self.xyxy[:, :2], self.xyxy[:, 2:] - self.xyxy[:, :2]], axis=1)
+
+    def to_normalized(self, image_size: Tuple[int, int]) -> np.array:
+        width, height = image_size
+        return self.xyxy / [width, height, width, height]
+
+    @property
+    def area(self) -> np.array:
+        return np.clip(self.xyxy[:, 2] - self.xyxy[:, 0], 0, None) * np.clip(self.xyxy[:, 3] - self.xyxy[:, 1], 0, None)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __getitem__(self, index) -> 'Boxes':
+        """Selects boxes by integer index array, slice or boolean mask"""
+        if isinstance(index, (int, np.integer)):
+            index = [index]
+        return Boxes(
+            self.xyxy[index],
+            scores=None if self.scores is None else self.scores[index],
+            labels=None if self.labels is None else self.labels[index],
+            image_ids=None if self.image_ids is None else self.image_ids[index],
+        )
+
+    def __iter__(self):
+        return (tuple(box) for box in self.xyxy.tolist())
+
+    def __repr__(self):
+        return f'Boxes(n={len(self)})'
+
+
+def _as_xyxy(boxes: Union[Boxes, np.array]) -> np.array:
+    return boxes.xyxy if isinstance(boxes, Boxes) else np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def box_iou(boxes_a: Union[Boxes, np.array], boxes_b: Union[Boxes, np.array]) -> np.array:
+    """Pairwise IoU matrix of shape (len(boxes_a), len(boxes_b)) for xyxy boxes"""
+    a, b = _as_xyxy(boxes_a), _as_xyxy(boxes_b)
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    intersection = wh[..., 0] * wh[..., 1]
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def _greedy_nms(xyxy: np.array, order: np.array, iou_threshold: float, max_matrix_size: int = 2048) -> list:
+    if len(order) <= max_matrix_size:
+        # Small groups: one IoU matrix, then a cheap boolean pass
+        ious = box_iou(xyxy[order], xyxy[order])
+        suppressed = np.zeros(len(order), dtype=bool)
+        keep = []
+        for i in range(len(order)):
+            if not suppressed[i]:
+                keep.append(order[i])
+                suppressed |= ious[i] > iou_threshold
+        return keep
+
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        order = rest[box_iou(xyxy[i:i+1], xyxy[rest])[0] <= iou_threshold]
+    return keep
+
+
+def nms(
+    boxes: Union[Boxes, np.array],
+    scores: Sequence[float] = None,
+    iou_threshold: float = 0.5,
+    labels: Sequence[int] = None,
+) -> np.array:
+    """Greedy non-maximum suppression.
+
+    Scores and labels default to those of `boxes`. With labels, boxes only
+    suppress boxes of the same label (and, for Boxes with image_ids, of the
+    same image); each group is suppressed separately so large image sets
+    stay fast.
+
+    Returns
+    -------
+    Indices of the kept boxes, by decreasing score.
+    """
+    xyxy = _as_xyxy(boxes)
+    scores = np.asarray(boxes.scores if scores is None else scores, dtype=np.float64)
+    if labels is None and isinstance(boxes, Boxes):
+        labels = boxes.labels
+
+    groups = np.zeros(len(xyxy), np.int64) if labels is None else np.asarray(labels, dtype=np.int64)
+    if isinstance(boxes, Boxes) and boxes.image_ids is not None:
+        groups = boxes.image_ids * (groups.max(initial=0) + 1) + groups
+
+    order = np.lexsort((-scores, groups))
+    bounds = np.flatnonzero(np.diff(groups[order])) + 1
+    keep = []
+    for group_order in np.split(order, bounds):
+        keep.extend(_greedy_nms(xyxy, group_order, iou_threshold))
+
+    keep = np.array(keep, dtype=np.int64)
+    return keep[np.argsort(-scores[keep], kind='stable')]
+
+
+def _average_precision(recall: np.array, precision: np.array) -> float:
+    """Area under the precision envelope (VOC all-point interpolation)"""
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([0.0], precision, [0.0]))
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.flatnonzero(recall[1:] != recall[:-1])
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+
+def match_detections(
+    ground_truth: Boxes,
+    predictions: Boxes,
+    iou_threshold: float = 0.5,
+) -> np.array:
+    """Greedily matches predictions to ground truth of the same image and label.
+
+    Predictions are taken by decreasing score and matched to the unmatched
+    ground truth box they overlap most, if that IoU reaches `iou_threshold`.
+
+    Returns
+    -------
+    Boolean array, True for predictions that are true positives.
+    """
+    def group_keys(boxes):
+        labels = np.zeros(len(boxes), np.int64) if boxes.labels is None else boxes.labels
+        image_ids = np.zeros(len(boxes), np.int64) if boxes.image_ids is None else boxes.image_ids
+        return image_ids, labels
+
+    gt_images, gt_labels = group_keys(ground_truth)
+    pred_images, pred_labels = group_keys(predictions)
+    num_labels = int(max(gt_labels.max(initial=0), pred_labels.max(initial=0))) + 1
+    gt_groups = gt_images * num_labels + gt_labels
+    pred_groups = pred_images * num_labels + pred_labels
+
+    gt_order = np.argsort(gt_groups, kind='stable')
+    gt_sorted = gt_groups[gt_order]
+    true_positive = np.zeros(len(predictions), dtype=bool)
+
+    for group in np.unique(pred_groups):
+        start, end = np.searchsorted(gt_sorted, [group, group + 1])
+        if start == end:
+            continue
+        pred_index = np.flatnonzero(pred_groups == group)
+        pred_index = pred_index[np.argsort(-predictions.scores[pred_index], kind='stable')]
+        ious = box_iou(predictions.xyxy[pred_index], ground_truth.xyxy[gt_order[start:end]])
+
+        matched = np.zeros(end - start, dtype=bool)
+        for row, i in enumerate(pred_index):
+            candidates = np.where(matched, -1.0, ious[row])
+            best = candidates.argmax()
+            if candidates[best] >= iou_threshold:
+                matched[best] = True
+                true_positive[i] = True
+    return true_positive
+
+
+def evaluate_detections(
+    ground_truth: Boxes,
+    predictions: Boxes,
+    iou_threshold: float = 0.5,
+) -> dict:
+    """Detection precision/recall and mAP over an image set.
+
+    Parameters
+    ----------
+    ground_truth : Boxes,
+        Boxes with labels (and image_ids for several images).
+
+    predictions : Boxes,
+        Boxes with scores, labels (and image_ids).
+
+    iou_threshold : float, default 0.5
+
+    Returns
+    -------
+    dict with `map` and, per label, `ap`, `precision` and `recall` curves
+    ordered by decreasing score. Labels without ground truth boxes have no
+    `ap` and do not count towards `map`.
+    """
+    true_positive = match_detections(ground_truth, predictions, iou_threshold)
+    gt_labels = np.zeros(len(ground_truth), np.int64) if ground_truth.labels is None else ground_truth.labels
+    pred_labels = np.zeros(len(predictions), np.int64) if predictions.labels is None else predictions.labels
+
+    result = {'ap': {}, 'precision': {}, 'recall': {}}
+    for label in np.union1d(np.unique(gt_labels), np.unique(pred_labels)):
+        num_gt = int((gt_labels == label).sum())
+        index = np.flatnonzero(pred_labels == label)
+        index = index[np.argsort(-predictions.scores[index], kind='stable')]
+
+        tp = np.cumsum(true_positive[index])
+        fp = np.cumsum(~true_positive[index])
+        precision = tp / np.maximum(tp + fp, 1)
+        recall = tp / num_gt if num_gt else np.zeros(len(tp))
+
+        label = int(label)
+        result['precision'][label] = precision
+        result['recall'][label] = recall
+        if num_gt:
+            result['ap'][label] = _average_precision(recall, precision)
+
+    result['map'] = float(np.mean(list(result['ap'].values()))) if result['ap'] else 0.0
+    return result
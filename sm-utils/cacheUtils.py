@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Mapping
+
+import numpy as np
+
+from .apiUtils import send_request_to_api
+from .smUtils import protobuf_to_numpy_mask
+
+
+def _compact(arr: np.array) -> np.array:
+    """Smallest integer dtype that holds `arr` exactly, e.g. float class masks to uint8"""
+    if arr.dtype.kind == 'f' and arr.size and np.all(np.isfinite(arr)) and np.array_equal(arr, np.rint(arr)):
+        low, high = arr.min(), arr.max()
+        for dtype in (np.uint8, np.uint16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return arr.astype(dtype)
+    return arr
+
+
+class ResponseCache:
+    """Disk cache of decoded endpoint responses with LRU eviction and TTL.
+
+    Entries are keyed by endpoint name, variant and the SHA-256 of the
+    request payload, and stored as compressed .npz files in the smallest
+    dtype that holds the result exactly. A file's mtime is its creation
+    time, used for the TTL, and hits set its atime, used as the LRU order,
+    so both are read with a stat. Safe for concurrent threads; files are
+    written atomically so several processes can share a directory. Each
+    process only counts the bytes it writes, so eviction rescans the
+    directory to include entries from the others.
+
+    Parameters
+    ----------
+    cache_dir : str,
+        Directory for the cache, created if missing.
+
+    max_bytes : int, default 10 GB
+        Least recently used entries are evicted above this size.
+
+    ttl : float, default None
+        Seconds after which an entry is considered stale. Never when None.
+
+    low_water : float, default 0.9
+        Eviction goes down to this fraction of `max_bytes`, so it runs once
+        per batch of puts rather than on every put once the cache is full.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 10 * 1024**3, ttl: float = None, low_water: float = 0.9):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(stat.st_size for _, stat in self._entries())
+
+    @staticmethod
+    def key(endpoint_name: str, payload: bytes, variant: str = None) -> str:
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        payload_hash = hashlib.sha256(payload).hexdigest()
+        return hashlib.sha256(f'{endpoint_name}\0{variant or ""}\0{payload_hash}'.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.npz')
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.npz'):
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.stat(path)
+                    except FileNotFoundError:
+                        pass
+
+    def _expired(self, stat: os.stat_result, now: float) -> bool:
+        return self.ttl is not None and now - stat.st_mtime > self.ttl
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def get(self, endpoint_name: str, payload: bytes, variant: str = None) -> np.array:
+        """Returns the cached result, or None on a miss or stale entry"""
+        path = self._path(self.key(endpoint_name, payload, variant))
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if self._expired(stat, time.time()):
+            self._remove(path)
+            return None
+        try:
+            with np.load(path) as entry:
+                dtype, data = str(entry['dtype']), entry['data']
+            # Only the atime moves, the mtime keeps the creation time
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+        return data.astype(dtype, copy=False)
+
+    def put(self, endpoint_name: str, payload: bytes, result: np.array, variant: str = None) -> None:
+        """Stores a decoded result and evicts old entries if over `max_bytes`"""
+        result = np.asarray(result)
+        path = self._path(self.key(endpoint_name, payload, variant))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, data=_compact(result), dtype=str(result.dtype))
+            size = os.path.getsize(tmp_path)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._size += size - previous
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def get_or_compute(
+        self,
+        endpoint_name: str,
+        payload: bytes,
+        compute: Callable[[], np.array],
+        variant: str = None,
+    ) -> np.array:
+        """Returns the cached result or calls `compute()` and caches its result"""
+        result = self.get(endpoint_name, payload, variant)
+        if result is None:
+            result = compute()
+            self.put(endpoint_name, payload, result, variant)
+        return result
+
+    def evict(self) -> None:
+        """Removes expired entries, then least recently used ones until under
+        `low_water * max_bytes`"""
+        now = time.time()
+        entries = []
+        size = 0
+        for path, stat in self._entries():
+            if self._expired(stat, now):
+                self._remove(path)
+            else:
+                entries.append((stat.st_atime, stat.st_size, path))
+                size += stat.st_size
+        # The rescan also picks up entries written or removed by other processes
+        with self._lock:
+            self._size = size
+        target = self.low_water * self.max_bytes
+        for _, _, path in sorted(entries):
+            if self._size <= target:
+                break
+            self._remove(path)
+
+    def clear(self) -> None:
+        for path, _ in list(self._entries()):
+            self._remove(path)
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+
+def invoke_endpoint_cached(
+    sm_runtime_client,
+    cache: ResponseCache,
+    endpoint_name: str,
+    payload: bytes,
+    content_type: str = 'image/png',
+    accept: str = 'application/x-protobuf',
+    target_variant: str = None,
+    target_model: str = None,
+    decode: Callable[[bytes], np.array] = protobuf_to_numpy_mask,
+) -> np.array:
+    """Invokes a Sagemaker endpoint through the cache and returns the decoded result.
+
+    Repeated payloads skip both the network round trip and `decode`.
+    """
+    variant = f'{target_variant or ""}|{target_model or ""}|{content_type}|{accept}'
+
+    def compute():
+        kwargs = {}
+        if target_variant:
+            kwargs['TargetVariant'] = target_variant
+        if target_model:
+            kwargs['TargetModel'] = target_model
+        resp = sm_runtime_client.invoke_endpoint(
+            EndpointName=endpoint_name, Body=payload, ContentType=content_type, Accept=accept, **kwargs
+        )
+        return decode(resp['Body'].read())
+
+    return cache.get_or_compute(endpoint_name, payload, compute, variant)
+
+
+def _request_payload(DATA):
+    """(bytes hashed for the cache key, data to send) for any send_request_to_api DATA"""
+    if DATA is None:
+        return b'', DATA
+    if isinstance(DATA, (bytes, bytearray, str)):
+        return DATA, DATA
+    if hasattr(DATA, 'read'):
+        DATA = DATA.read()
+        return DATA, DATA
+    if isinstance(DATA, Mapping) or (isinstance(DATA, (list, tuple)) and all(isinstance(d, tuple) for d in DATA)):
+        # Form fields, encoded by requests
+        return json.dumps(DATA, sort_keys=isinstance(DATA, Mapping), default=str).encode('utf-8'), DATA
+    # Generators and other iterables of chunks can only be read once
+    DATA = b''.join(chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in DATA)
+    return DATA, DATA
+
+
+def send_request_to_api_cached(
+    cache: ResponseCache,
+    DATA,
+    URL,
+    CONTENT_TYPE=None,
+    ACCEPT_TYPE=None,
+    API_KEY=None,
+    decode: Callable[[bytes], np.array] = protobuf_to_numpy_mask,
+) -> np.array:
+    """send_request_to_api through the cache, returning the decoded response content.
+
+    File objects and generators are read into memory once to hash them.
+    """
+    payload, DATA = _request_payload(DATA)
+
+    def compute():
+        response = send_request_to_api(DATA, URL, CONTENT_TYPE, ACCEPT_TYPE, API_KEY)
+        response.raise_for_status()
+        return decode(response.content)
+
+    return cache.get_or_compute(URL, payload, compute, variant=f'{CONTENT_TYPE or ""}|{ACCEPT_TYPE or ""}')
@@ -5,13 +5,13 @@ import seaborn as sns
 from typing import Sequence
 
 
-def plot_confusion_matrix(
+def get_confusion_matrix(
     y_true: Sequence,
     y_pred: Sequence,
     y_pred_scores: Sequence = None,
     labels: Sequence = None
 ):
-    """Creates confusion matrix with confidence scores.
+    """Counts predictions per (actual, predicted) label pair.
 
     Parameters:
     -----------
@@ -22,9 +22,14 @@ def plot_confusion_matrix(
     y_pred_scores: Sequence
         predicted label confidence score
     labels: Sequence
-        label names in order to be displayed
+        label names in matrix order
+
+    Returns:
+    --------
+    Count matrix and mean confidence score matrix (None without scores),
+    indexed [actual][predicted].
     """
-    if not labels:
+    if labels is None or not len(labels):
         labels = np.unique(list(y_true)+list(y_pred))
 
     y_true = np.array(y_true)
@@ -33,6 +38,7 @@ def plot_confusion_matrix(
         y_pred_scores = np.array(y_pred_scores)
 
     cm = np.zeros((len(labels), len(labels))) #Count matrix
+    cs = None
     if y_pred_scores is not None:
         cs = np.zeros((len(labels), len(labels))) #Confidence score matrix
 
@@ -44,6 +50,33 @@ def plot_confusion_matrix(
                 scores = y_pred_scores[y_true==l][y_pred[y_true==l]==ol]
                 cs[a][p] = 0 if len(scores) == 0 else scores.mean()
 
+    return cm, cs
+
+
+def plot_confusion_matrix(
+    y_true: Sequence,
+    y_pred: Sequence,
+    y_pred_scores: Sequence = None,
+    labels: Sequence = None
+):
+    """Creates confusion matrix with confidence scores.
+
+    Parameters:
+    -----------
+    y_true: Sequence
+        true/actual labels
+    y_pred: Sequence
+        predicted labels
+    y_pred_scores: Sequence
+        predicted label confidence score
+    labels: Sequence
+        label names in order to be displayed
+    """
+    if not labels:
+        labels = np.unique(list(y_true)+list(y_pred))
+
+    cm, cs = get_confusion_matrix(y_true, y_pred, y_pred_scores, labels)
+
     cn = cm / cm.sum(axis=0, keepdims=True) #Normalised matrix for cell color
 
     # Annotation labels
@@ -0,0 +1,525 @@
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Sequence
+
+from . import telemetry
+
+
+class _Stages:
+    """Seconds spent per stage (network, decode, compute...), summed over threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = {}
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+
+
+class _Profiler:
+    """cProfile for every thread running wrapped functions, merged into one pstats.Stats.
+
+    cProfile only follows the thread that enabled it, so each worker thread
+    gets its own profile, started by the wrapper or, for threads started
+    while profiling (e.g. pools inside library functions), by a
+    threading.setprofile hook. Needs Python < 3.12: from 3.12 cProfile is built on
+    the process-wide sys.monitoring, so only one profile can be enabled and it
+    sees every thread through a single call stack, garbling threaded timings.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiles = []
+
+    def _profile(self):
+        import cProfile
+
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def _profile_thread(self, frame, event, arg) -> None:
+        # Replaces this hook with the thread's own profile until the thread ends
+        self._local.whole_thread = True
+        self._profile().enable()
+
+    def start(self) -> None:
+        threading.setprofile(self._profile_thread)
+
+    def stop(self) -> None:
+        threading.setprofile(None)
+
+    def wrap(self, func: Callable) -> Callable:
+        def profiled(*args, **kwargs):
+            if getattr(self._local, 'whole_thread', False):
+                return func(*args, **kwargs)
+            profile = self._profile()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def _stats(self):
+        import pstats
+
+        profiles = [p for p in self._profiles if p.getstats()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def hot_functions(self, sort: str, top: int) -> list:
+        stats = self._stats()
+        if stats is None:
+            return []
+        stats.sort_stats(sort)
+        hot = []
+        for func in stats.fcn_list[:top]:
+            calls, _, tottime, cumtime, _ = stats.stats[func]
+            filename, line, name = func
+            hot.append({'function': f'{filename}:{line}({name})', 'calls': calls, 'tottime': tottime, 'cumtime': cumtime})
+        return hot
+
+    def dump(self, path: str) -> None:
+        """Writes the merged profile in pstats format (pstats, snakeviz, flameprof)"""
+        stats = self._stats()
+        if stats is not None:
+            stats.dump_stats(path)
+
+
+class _Sampler:
+    """Wall-clock sampling profiler over every thread, using sys._current_frames.
+
+    Works on any Python version and with any number of threads, at the cost
+    of statistical times and no call counts. Samples include threads waiting
+    on locks or sockets, so pool and network waits show up as their own
+    functions.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._self_seconds = {}
+        self._cumulative_seconds = {}
+        self._stacks = {}
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='smutils-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def wrap(self, func: Callable) -> Callable:
+        return func
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            # Weight samples by the time since the previous one: busy threads
+            # holding the GIL delay the sampler well past `interval`
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                self._self_seconds[stack[0]] = self._self_seconds.get(stack[0], 0.0) + weight
+                for func in set(stack):
+                    self._cumulative_seconds[func] = self._cumulative_seconds.get(func, 0.0) + weight
+                folded = ';'.join(f'{name} ({filename}:{line})' for filename, line, name in reversed(stack))
+                self._stacks[folded] = self._stacks.get(folded, 0) + 1
+
+    def hot_functions(self, sort: str, top: int) -> list:
+        seconds = self._cumulative_seconds if sort == 'cumulative' else self._self_seconds
+        hot = []
+        for func, _ in sorted(seconds.items(), key=lambda item: -item[1])[:top]:
+            filename, line, name = func
+            hot.append({
+                'function': f'{filename}:{line}({name})',
+                'calls': None,
+                'tottime': self._self_seconds.get(func, 0.0),
+                'cumtime': self._cumulative_seconds.get(func, 0.0),
+            })
+        return hot
+
+    def dump(self, path: str) -> None:
+        """Writes folded stacks, as py-spy --format raw (flamegraph.pl, speedscope, inferno)"""
+        with open(path, 'w') as f:
+            for stack, count in sorted(self._stacks.items()):
+                f.write(f'{stack} {count}\n')
+
+
+def _make_profiler(kind: str):
+    if kind == 'none':
+        return None
+    if kind == 'auto':
+        kind = 'sample' if sys.version_info >= (3, 12) else 'cprofile'
+    if kind == 'cprofile' and sys.version_info >= (3, 12):
+        raise SystemExit('--profiler cprofile needs Python < 3.12 for threaded operations, use --profiler sample')
+    return _Sampler() if kind == 'sample' else _Profiler()
+
+
+def _peak_rss_bytes() -> int:
+    """Peak resident set size of this process, None where unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _read_uri(s3_client, uri: str) -> bytes:
+    from .s3Utils import read_file_from_s3
+
+    if uri.startswith('s3://'):
+        return read_file_from_s3(s3_client, s3_uri=uri)
+    with open(uri, 'rb') as f:
+        return f.read()
+
+
+def _stage(uri: str) -> str:
+    return 'network' if uri.startswith('s3://') else 'read'
+
+
+def _read_manifest(s3_client, uri: str, limit: int = None) -> Sequence[dict]:
+    lines = [json.loads(line) for line in _read_uri(s3_client, uri).splitlines() if line.strip()]
+    return lines[:limit] if limit else lines
+
+
+def _s3_client(args):
+    from .s3Utils import get_s3_client
+
+    return get_s3_client(
+        max_concurrency=args.max_workers * getattr(args, 'part_concurrency', 1),
+        region_name=args.region,
+        profile_name=args.aws_profile,
+    )
+
+
+def _run_download(args, stages: _Stages, wrap: Callable) -> dict:
+    from .s3Utils import download_s3_folder
+
+    with stages.time('network'):
+        summary = download_s3_folder(
+            _s3_client(args), args.local_dir, s3_uri=args.s3_uri, verify=args.verify,
+            max_workers=args.max_workers, multipart_threshold=args.part_size,
+            multipart_chunksize=args.part_size, part_concurrency=args.part_concurrency,
+        )
+    return {'items': len(summary['downloaded']), 'bytes': summary['bytes']}
+
+
+def _run_evaluate(args, stages: _Stages, wrap: Callable) -> dict:
+    from .maskStore import decode_mask_image
+    from .segmentMetrics import get_multiclass_dice, get_multiclass_iou
+
+    s3_client = _s3_client(args)
+    metric = get_multiclass_dice if args.metric == 'dice' else get_multiclass_iou
+    with stages.time(_stage(args.manifest)):
+        lines = _read_manifest(s3_client, args.manifest, args.limit)
+
+    def evaluate(line):
+        with stages.time(_stage(line[args.true_attribute])):
+            true_bytes = _read_uri(s3_client, line[args.true_attribute])
+        with stages.time(_stage(line[args.pred_attribute])):
+            pred_bytes = _read_uri(s3_client, line[args.pred_attribute])
+        with stages.time('decode'):
+            y_true, y_pred = decode_mask_image(true_bytes), decode_mask_image(pred_bytes)
+        with stages.time('compute'):
+            value = metric(y_true, y_pred)
+        return value, len(true_bytes) + len(pred_bytes)
+
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        results = list(executor.map(wrap(evaluate), lines))
+    values = [value for value, _ in results]
+    return {
+        'items': len(results),
+        'bytes': sum(nbytes for _, nbytes in results),
+        f'mean_{args.metric}': sum(values) / len(values) if values else None,
+    }
+
+
+def _run_overlay(args, stages: _Stages, wrap: Callable) -> dict:
+    from PIL import Image
+
+    from .imUtils import image_to_bytes
+    from .segmentUtils import overlay_mask
+    from .smUtils import find_mask_attribute
+
+    s3_client = _s3_client(args)
+    with stages.time(_stage(args.manifest)):
+        lines = _read_manifest(s3_client, args.manifest, args.limit)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    def render(i_line):
+        i, line = i_line
+        mask_attribute = args.mask_attribute or find_mask_attribute(line, args.image_attribute)
+        with stages.time(_stage(line[args.image_attribute])):
+            image_bytes = _read_uri(s3_client, line[args.image_attribute])
+        with stages.time(_stage(line[mask_attribute])):
+            mask_bytes = _read_uri(s3_client, line[mask_attribute])
+        with stages.time('decode'):
+            image = Image.open(io.BytesIO(image_bytes))
+            segment = Image.open(io.BytesIO(mask_bytes))
+            image.load()
+            segment.load()
+        with stages.time('compute'):
+            out = image_to_bytes(overlay_mask(image, segment, args.alpha), 'PNG')
+        if args.output_dir:
+            with stages.time('write'):
+                with open(os.path.join(args.output_dir, f'{i:08d}.png'), 'wb') as f:
+                    f.write(out)
+        return len(image_bytes) + len(mask_bytes)
+
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        sizes = list(executor.map(wrap(render), enumerate(lines)))
+    return {'items': len(sizes), 'bytes': sum(sizes)}
+
+
+# Files picked from directories and s3 prefixes per --format, files without an extension included
+DECODE_EXTENSIONS = {
+    'protobuf': ('', '.pb', '.protobuf', '.recordio', '.bin', '.out'),
+    'png': ('.png',),
+}
+
+
+def _run_decode(args, stages: _Stages, wrap: Callable) -> dict:
+    from .s3Utils import S3Location, list_s3_objects
+    from .segmentPostprocess import to_class_mask
+
+    if args.format == 'png':
+        from .maskStore import decode_mask_image as decode
+    else:
+        from .smUtils import protobuf_to_numpy_mask as decode
+
+    def response_file(name):
+        return os.path.splitext(name)[1].lower() in DECODE_EXTENSIONS[args.format]
+
+    s3_client = None
+    uris = []
+    for source in args.sources:
+        if source.startswith('s3://'):
+            s3_client = s3_client or _s3_client(args)
+            location = S3Location.from_uri(source)
+            with stages.time('network'):
+                uris.extend(
+                    S3Location(location.bucket, obj['Key']).uri
+                    for obj in list_s3_objects(s3_client, s3_uri=location)
+                    if not obj['Key'].endswith('/') and response_file(obj['Key'])
+                )
+        elif os.path.isdir(source):
+            uris.extend(sorted(
+                entry.path for entry in os.scandir(source) if entry.is_file() and response_file(entry.name)
+            ))
+        else:
+            uris.append(source)
+    uris = uris[:args.limit] if args.limit else uris
+
+    def run(uri):
+        with stages.time(_stage(uri)):
+            body = _read_uri(s3_client, uri)
+        with stages.time('decode'):
+            arr = decode(body)
+        with stages.time('compute'):
+            to_class_mask(arr)
+        return len(body)
+
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        sizes = list(executor.map(wrap(run), uris))
+    return {'items': len(sizes), 'bytes': sum(sizes)}
+
+
+OPERATIONS = {
+    'download': _run_download,
+    'evaluate': _run_evaluate,
+    'overlay': _run_overlay,
+    'decode': _run_decode,
+}
+
+
+def profile(args) -> dict:
+    """Runs one operation under a profiler, stage timers and s3 telemetry.
+
+    Returns
+    -------
+    dict report with `wall_seconds`, `items`, `bytes`, throughputs,
+    `peak_rss_bytes`, `stages` (seconds summed over worker threads),
+    `telemetry` (per-operation s3/api totals) and `hot_functions`.
+    """
+    stages = _Stages()
+    profiler = _make_profiler('none' if args.no_profile else args.profiler)
+    wrap = profiler.wrap if profiler is not None else (lambda func: func)
+    telemetry.registry.reset()
+    telemetry.enable(telemetry.registry)
+
+    if profiler is not None:
+        profiler.start()
+    start = time.perf_counter()
+    try:
+        result = wrap(OPERATIONS[args.operation])(args, stages, wrap)
+    finally:
+        wall_seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.stop()
+        telemetry.disable(telemetry.registry)
+
+    report = {
+        'operation': args.operation,
+        'wall_seconds': wall_seconds,
+        'max_workers': args.max_workers,
+        **result,
+        'items_per_second': result['items'] / wall_seconds if wall_seconds else 0.0,
+        'bytes_per_second': result['bytes'] / wall_seconds if wall_seconds else 0.0,
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'stages': dict(sorted(stages.seconds.items(), key=lambda item: -item[1])),
+        'telemetry': telemetry.registry.snapshot(),
+        'hot_functions': [],
+    }
+
+    if profiler is not None:
+        report['hot_functions'] = profiler.hot_functions(args.sort, args.top)
+        if args.profile_out:
+            profiler.dump(args.profile_out)
+    return report
+
+
+def print_report(report: dict, file=sys.stdout) -> None:
+    def mb(nbytes):
+        return f'{nbytes / 1e6:.1f} MB'
+
+    print(f"\n{report['operation']}: {report['items']} items, {mb(report['bytes'])} "
+          f"in {report['wall_seconds']:.2f} s with {report['max_workers']} workers", file=file)
+    print(f"  throughput  {report['items_per_second']:.1f} items/s, {mb(report['bytes_per_second'])}/s", file=file)
+    if report['peak_rss_bytes'] is not None:
+        print(f"  peak RSS    {mb(report['peak_rss_bytes'])}", file=file)
+    for key, value in report.items():
+        if key.startswith('mean_') and value is not None:
+            print(f'  {key:<11} {value:.4f}', file=file)
+
+    total = sum(report['stages'].values())
+    if total:
+        print('\nStages (seconds summed over worker threads)', file=file)
+        for stage, seconds in report['stages'].items():
+            print(f'  {stage:<10} {seconds:9.2f} s  {100 * seconds / total:5.1f}%', file=file)
+
+    if report['telemetry']:
+        print('\nI/O', file=file)
+        for operation, stats in sorted(report['telemetry'].items()):
+            print(f"  {operation:<20} calls {stats['calls']:>6}  requests {stats['requests']:>6}  "
+                  f"retries {stats['retries']:>4}  errors {stats['errors']:>4}  {mb(stats['bytes']):>10}  "
+                  f"p50 {1000 * stats['p50']:.1f} ms  p99 {1000 * stats['p99']:.1f} ms", file=file)
+
+    if report['hot_functions']:
+        print('\nHot functions', file=file)
+        print(f"  {'calls':>8} {'tottime':>9} {'cumtime':>9}  function", file=file)
+        for func in report['hot_functions']:
+            calls = '-' if func['calls'] is None else func['calls']
+            print(f"  {calls:>8} {func['tottime']:9.3f} {func['cumtime']:9.3f}  {func['function']}", file=file)
+
+
+def _add_profile_parser(subparsers) -> None:
+    parser = subparsers.add_parser(
+        'profile', help='Run an operation and report its performance',
+        description='Runs an smUtils operation and reports wall time, throughput, peak RSS, '
+                    'a network/decode/compute split and the hottest functions.',
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--max-workers', type=int, default=16, help='Concurrent items (default 16)')
+    common.add_argument('--limit', type=int, default=None, help='Only process the first N items')
+    common.add_argument('--region', default=None, help='AWS region')
+    common.add_argument('--aws-profile', default=None, help='AWS credentials profile')
+    common.add_argument('--top', type=int, default=20, help='Hot functions to show (default 20)')
+    common.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'ncalls'],
+                        help='Hot function order (default cumulative)')
+    common.add_argument('--profiler', default='auto', choices=['auto', 'cprofile', 'sample'],
+                        help='cprofile: per-thread cProfile, exact call counts, Python < 3.12 only. '
+                             'sample: wall-clock stack sampling of all threads. '
+                             'auto (default): cprofile before Python 3.12, sample from 3.12')
+    common.add_argument('--profile-out', default=None, metavar='PATH',
+                        help='Dump the profile: pstats format for cprofile (pstats, snakeviz), '
+                             'folded stacks for sample (flamegraph.pl, speedscope, as py-spy --format raw)')
+    common.add_argument('--json', default=None, metavar='PATH', help='Also write the report as JSON')
+    common.add_argument('--no-profile', action='store_true', help='Skip profiling, for lower overhead')
+
+    operations = parser.add_subparsers(dest='operation', required=True)
+
+    download = operations.add_parser('download', parents=[common], help='Download an s3 prefix')
+    download.add_argument('s3_uri', help='s3://bucket/prefix/')
+    download.add_argument('local_dir')
+    download.add_argument('--part-size', type=int, default=8 * 1024 * 1024, help='Bytes per part (default 8 MB)')
+    download.add_argument('--part-concurrency', type=int, default=4, help='Parts per file in flight (default 4)')
+    download.add_argument('--verify', action='store_true', help='Verify ETags with download_file_from_s3')
+
+    evaluate = operations.add_parser('evaluate', parents=[common], help='Score predicted masks in a manifest')
+    evaluate.add_argument('manifest', help='Local or s3:// manifest with ground truth and predicted mask uris')
+    evaluate.add_argument('--pred-attribute', required=True, help='Attribute holding the predicted mask uri')
+    evaluate.add_argument('--true-attribute', required=True, help='Attribute holding the ground truth mask uri')
+    evaluate.add_argument('--metric', default='iou', choices=['iou', 'dice'])
+
+    overlay = operations.add_parser('overlay', parents=[common], help='Render mask overlays for a manifest')
+    overlay.add_argument('manifest', help='Local or s3:// manifest with image and mask uris')
+    overlay.add_argument('--image-attribute', default='source-ref')
+    overlay.add_argument('--mask-attribute', default=None, help='Default: first *-ref other than the image')
+    overlay.add_argument('--alpha', type=int, default=127)
+    overlay.add_argument('--output-dir', default=None, help='Write overlays here as PNG')
+
+    decode = operations.add_parser('decode', parents=[common], help='Decode saved endpoint responses')
+    decode.add_argument('sources', nargs='+', help='Response files, directories or s3:// prefixes')
+    decode.add_argument('--format', default='protobuf', choices=['protobuf', 'png'],
+                        help='protobuf (recordio, as from the segmentation endpoint) or png masks. '
+                             'Directories and prefixes only contribute .png files for png, and files '
+                             'with no extension or .pb/.protobuf/.recordio/.bin/.out for protobuf')
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='smutils', description='smUtils command line tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    _add_profile_parser(subparsers)
+    args = parser.parse_args(argv)
+
+    report = profile(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0
+
+
+def bench_main(argv: Sequence[str] = None) -> int:
+    """`smutils-bench <operation> ...`, shorthand for `smutils profile <operation> ...`"""
+    return main(['profile'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .s3Utils import S3Location, list_s3_objects, read_file_from_s3, resolve_s3_prefix
+from .segmentMetrics import get_multiclass_iou
+
+
+DATA_FILENAME = 'masks.bin'
+INDEX_FILENAME = 'index.json'
+ALIGNMENT = 8
+
+
+def rle_encode(mask: np.array) -> Tuple[np.array, np.array]:
+    """Run length encodes a uint8 mask in row-major order.
+
+    Returns
+    -------
+    (values, lengths) arrays of uint8 and uint32 with one entry per run.
+    """
+    flat = mask.ravel()
+    if flat.size == 0:
+        return np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint32)
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    lengths = np.diff(np.append(starts, flat.size)).astype(np.uint32)
+    return flat[starts].astype(np.uint8), lengths
+
+
+def rle_decode(values: np.array, lengths: np.array, shape: Sequence) -> np.array:
+    """Inverse of rle_encode"""
+    return np.repeat(values, lengths).reshape(shape)
+
+
+def decode_mask_image(bytes_obj: bytes) -> np.array:
+    """Decodes a single channel ('P' or 'L') PNG mask to a uint8 array"""
+    image = Image.open(io.BytesIO(bytes_obj))
+    if image.mode not in ('P', 'L'):
+        raise ValueError(f'Expected a single channel mask image, got mode {image.mode}')
+    return np.asarray(image, dtype=np.uint8)
+
+
+class MaskStore:
+    """Read-only store of decoded masks in one memory-mapped file.
+
+    Masks are decoded once by MaskStore.build or MaskStore.from_s3 and stored
+    back to back as uint8, either raw or run length encoded. Raw masks are
+    returned as zero-copy read-only views into the memory map, RLE masks are
+    expanded on access.
+
+    Parameters
+    ----------
+    path : str,
+        Directory written by MaskStore.build.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILENAME), 'r') as f:
+            self.index = json.load(f)
+
+        data_path = os.path.join(path, DATA_FILENAME)
+        if os.path.getsize(data_path):
+            self._data = np.memmap(data_path, dtype=np.uint8, mode='r')
+        else:
+            self._data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        for key in self.index:
+            yield key, self[key]
+
+    def __getitem__(self, key: str) -> np.array:
+        offset, shape, encoding, num_runs = self.index[key]
+        if encoding == 'raw':
+            return self._data[offset:offset + int(np.prod(shape))].reshape(shape)
+
+        lengths_offset = offset + _align(num_runs)
+        values = self._data[offset:offset + num_runs]
+        lengths = self._data[lengths_offset:lengths_offset + 4 * num_runs].view('<u4')
+        return rle_decode(values, lengths, shape)
+
+    @classmethod
+    def build(
+        cls,
+        path: str,
+        masks: Iterable[Tuple[str, np.array]],
+        compress: Union[bool, str] = 'auto',
+    ) -> 'MaskStore':
+        """Writes masks to a new store and opens it.
+
+        Parameters
+        ----------
+        path : str,
+            Directory to write the store to, created if missing.
+
+        masks : Iterable[(key, array)],
+            2D integer masks with values in 0-255.
+
+        compress : bool or 'auto', default 'auto'
+            Run length encode masks. 'auto' encodes masks only when that at
+            least halves their size, which is typical for sparse masks.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        index = {}
+        offset = 0
+        with open(os.path.join(path, DATA_FILENAME), 'wb') as f:
+            for key, mask in masks:
+                mask = np.ascontiguousarray(mask, dtype=np.uint8)
+                record, encoding, num_runs = mask.tobytes(), 'raw', 0
+
+                if compress:
+                    values, lengths = rle_encode(mask)
+                    rle_nbytes = _align(len(values)) + 4 * len(lengths)
+                    if compress != 'auto' or rle_nbytes * 2 <= mask.nbytes:
+                        padding = b'\0' * (_align(len(values)) - len(values))
+                        record = values.tobytes() + padding + lengths.astype('<u4').tobytes()
+                        encoding, num_runs = 'rle', len(values)
+
+                index[key] = [offset, list(mask.shape), encoding, num_runs]
+                f.write(record)
+                f.write(b'\0' * (_align(len(record)) - len(record)))
+                offset += _align(len(record))
+
+        with open(os.path.join(path, INDEX_FILENAME), 'w') as f:
+            json.dump(index, f)
+        return cls(path)
+
+    @classmethod
+    def from_s3(
+        cls,
+        path: str,
+        s3_client,
+        s3_uri: Union[str, S3Location] = None,
+        bucket_name: str = None,
+        prefix: str = None,
+        suffix: str = '.png',
+        compress: Union[bool, str] = 'auto',
+        max_workers: int = 16,
+    ) -> 'MaskStore':
+        """Downloads and decodes every mask below an s3 prefix into a new store.
+
+        Masks are keyed by their key relative to the prefix.
+
+        Must provide at least one of the following combinations:
+          - s3_uri
+          - bucket_name and prefix
+        """
+        location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+        keys = [
+            obj['Key'] for obj in list_s3_objects(s3_client, s3_uri=location)
+            if obj['Key'].endswith(suffix)
+        ]
+
+        def fetch(key):
+            mask = decode_mask_image(read_file_from_s3(s3_client, bucket_name=location.bucket, key=key))
+            return os.path.relpath(key, location.key), mask
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return cls.build(path, executor.map(fetch, keys), compress=compress)
+
+
+def _align(nbytes: int) -> int:
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+
+def evaluate_masks(
+    y_true: Mapping[str, np.array],
+    y_pred: Mapping[str, np.array],
+    metric: Callable = get_multiclass_iou,
+) -> dict:
+    """Applies a segmentMetrics function to every key present in both mappings.
+
+    Either side can be a MaskStore, so ground truth is decoded once and reused
+    across model versions.
+
+    Returns
+    -------
+    dict mapping each key to its metric value.
+    """
+    return {key: metric(y_true[key], y_pred[key]) for key in y_true if key in y_pred}
@@ -0,0 +1,260 @@
+import numpy as np
+
+from typing import Sequence, Union
+
+
+class RLEMask:
+    """Binary mask stored as COCO-style run lengths.
+
+    Runs are counted in column-major (Fortran) order and alternate between
+    background and foreground, starting with background, exactly like
+    pycocotools. Areas, intersections and IoU/Dice are computed on the runs
+    without expanding to a dense array.
+
+    Parameters
+    ----------
+    size : Sequence[int],
+        (height, width) of the mask.
+
+    counts : Sequence[int],
+        Run lengths, starting with a (possibly empty) background run.
+    """
+    __slots__ = ('size', 'counts', '_ends')
+
+    def __init__(self, size: Sequence[int], counts: Sequence[int]):
+        self.size = (int(size[0]), int(size[1]))
+        self.counts = np.asarray(counts, dtype=np.int64)
+        if self.counts.sum() != self.size[0] * self.size[1]:
+            raise ValueError(f'Run lengths sum to {self.counts.sum()}, expected {self.size[0] * self.size[1]}')
+        self._ends = None
+
+    @classmethod
+    def from_array(cls, mask: np.array) -> 'RLEMask':
+        """Encodes a 2D array, treating every non-zero pixel as foreground"""
+        flat = np.asarray(mask).ravel(order='F') != 0
+        change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+        bounds = np.concatenate(([0], change, [flat.size]))
+        counts = np.diff(bounds)
+        if flat.size and flat[0]:
+            counts = np.concatenate(([0], counts))
+        return cls(mask.shape[:2], counts)
+
+    def to_array(self) -> np.array:
+        """Decodes to a dense (height, width) uint8 array of 0/1"""
+        values = np.arange(len(self.counts), dtype=np.uint8) & 1
+        return np.repeat(values, self.counts).reshape(self.size, order='F')
+
+    @classmethod
+    def from_coco(cls, rle: dict) -> 'RLEMask':
+        """Reads a COCO RLE dict with either list or compressed string counts"""
+        counts = rle['counts']
+        if isinstance(counts, (str, bytes)):
+            counts = _string_to_counts(counts)
+        return cls(rle['size'], counts)
+
+    def to_coco(self, compressed: bool = True) -> dict:
+        """Returns a COCO RLE dict, with pycocotools' string encoding of counts
+        when `compressed`"""
+        if compressed:
+            return {'size': list(self.size), 'counts': _counts_to_string(self.counts)}
+        return {'size': list(self.size), 'counts': self.counts.tolist()}
+
+    @property
+    def ends(self) -> np.array:
+        """Cumulative run ends, cached since every binary operation needs them"""
+        if self._ends is None:
+            self._ends = np.cumsum(self.counts)
+        return self._ends
+
+    @property
+    def area(self) -> int:
+        return int(self.counts[1::2].sum())
+
+    @property
+    def bbox(self) -> Sequence[int]:
+        """COCO [x, y, width, height] box of the foreground"""
+        if not self.area:
+            return [0, 0, 0, 0]
+        height = self.size[0]
+        starts = (self.ends - self.counts)[1::2]
+        lasts = self.ends[1::2] - 1
+        keep = self.counts[1::2] > 0
+        starts, lasts = starts[keep], lasts[keep]
+
+        x1, x2 = starts.min() // height, lasts.max() // height
+        single_column = starts // height == lasts // height
+        y1 = np.where(single_column, starts % height, 0).min()
+        y2 = np.where(single_column, lasts % height, height - 1).max()
+        return [int(x1), int(y1), int(x2 - x1 + 1), int(y2 - y1 + 1)]
+
+    def _check_size(self, other: 'RLEMask'):
+        if self.size != other.size:
+            raise ValueError(f'Mask sizes differ: {self.size} and {other.size}')
+
+    def intersection(self, other: 'RLEMask') -> int:
+        """Number of foreground pixels shared with `other`"""
+        self._check_size(other)
+        lengths, a, b = _merge_runs(self.ends, other.ends)
+        return int(lengths[a & b].sum())
+
+    def union(self, other: 'RLEMask') -> int:
+        """Number of pixels that are foreground in either mask"""
+        return self.area + other.area - self.intersection(other)
+
+    def iou(self, other: 'RLEMask') -> float:
+        """IoU with `other`, 1 when both masks are empty as in get_iou_coef"""
+        intersection = self.intersection(other)
+        union = self.area + other.area - intersection
+        return 1.0 if union == 0 else intersection / union
+
+    def dice(self, other: 'RLEMask') -> float:
+        """Dice coefficient with `other`, 1 when both masks are empty as in get_dice_coef"""
+        total = self.area + other.area
+        return 1.0 if total == 0 else 2 * self.intersection(other) / total
+
+    def __and__(self, other: 'RLEMask') -> 'RLEMask':
+        self._check_size(other)
+        lengths, a, b = _merge_runs(self.ends, other.ends)
+        return _from_segments(self.size, lengths, a & b)
+
+    def __or__(self, other: 'RLEMask') -> 'RLEMask':
+        self._check_size(other)
+        lengths, a, b = _merge_runs(self.ends, other.ends)
+        return _from_segments(self.size, lengths, a | b)
+
+    def __eq__(self, other):
+        if not isinstance(other, RLEMask):
+            return NotImplemented
+        return self.size == other.size and np.array_equal(_canonical(self.counts), _canonical(other.counts))
+
+    def __repr__(self):
+        return f'RLEMask(size={self.size}, runs={len(self.counts)}, area={self.area})'
+
+
+def _canonical(counts: np.array) -> np.array:
+    """Drops empty runs after the first so equal masks compare equal"""
+    return _from_segments((1, int(counts.sum())), counts, np.arange(len(counts)) & 1).counts
+
+
+def _merge_runs(ends_a: np.array, ends_b: np.array):
+    """Splits two run lists on the union of their boundaries.
+
+    Returns
+    -------
+    (lengths, a, b) where `a` and `b` are the boolean values of each mask on
+    segments of the given lengths.
+    """
+    bounds = np.union1d(ends_a, ends_b)
+    starts = np.concatenate(([0], bounds[:-1]))
+    lengths = bounds - starts
+    a = (np.searchsorted(ends_a, starts, side='right') & 1).astype(bool)
+    b = (np.searchsorted(ends_b, starts, side='right') & 1).astype(bool)
+    return lengths, a, b
+
+
+def _from_segments(size: Sequence[int], lengths: np.array, values: np.array) -> RLEMask:
+    """Builds a RLEMask from segments, merging neighbours with equal values"""
+    keep = lengths > 0
+    lengths, values = lengths[keep], np.asarray(values, dtype=bool)[keep]
+    if not len(lengths):
+        return RLEMask(size, [0])
+    change = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+    counts = np.add.reduceat(lengths, change)
+    if values[0]:
+        counts = np.concatenate(([0], counts))
+    return RLEMask(size, counts)
+
+
+def _counts_to_string(counts: Sequence[int]) -> str:
+    """pycocotools rleToString: delta coded, 5 bits per character"""
+    chars = []
+    for i, x in enumerate(int(c) for c in counts):
+        if i > 2:
+            x -= int(counts[i - 2])
+        more = True
+        while more:
+            c = x & 0x1f
+            x >>= 5
+            more = (x != -1) if (c & 0x10) else (x != 0)
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return ''.join(chars)
+
+
+def _string_to_counts(string: Union[str, bytes]) -> list:
+    """pycocotools rleFrString"""
+    if isinstance(string, bytes):
+        string = string.decode('ascii')
+    counts = []
+    p = 0
+    while p < len(string):
+        x, k, more = 0, 0, True
+        while more:
+            c = ord(string[p]) - 48
+            x |= (c & 0x1f) << (5 * k)
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and (c & 0x10):
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def encode_masks(masks: np.array) -> Sequence[RLEMask]:
+    """Encodes a (N, height, width) batch of instance masks"""
+    return [RLEMask.from_array(mask) for mask in masks]
+
+
+def rle_iou(
+    masks_a: Sequence[RLEMask],
+    masks_b: Sequence[RLEMask],
+    iscrowd: Sequence[bool] = None,
+) -> np.array:
+    """Pairwise IoU matrix between two lists of RLE masks.
+
+    Pairs whose foreground extents do not overlap are skipped without
+    merging their runs.
+
+    Parameters
+    ----------
+    masks_a : Sequence[RLEMask],
+        e.g. detections, one row each.
+
+    masks_b : Sequence[RLEMask],
+        e.g. ground truth, one column each.
+
+    iscrowd : Sequence[bool], default None
+        Per mask in `masks_b`; as in pycocotools, crowd regions use the area
+        of the `masks_a` mask as denominator instead of the union.
+    """
+    ious = np.zeros((len(masks_a), len(masks_b)))
+    if not len(masks_a) or not len(masks_b):
+        return ious
+
+    def extents(masks):
+        first, last = np.zeros(len(masks), np.int64), np.full(len(masks), -1, np.int64)
+        for i, mask in enumerate(masks):
+            fg = np.flatnonzero(mask.counts[1::2]) * 2 + 1
+            if len(fg):
+                first[i] = mask.ends[fg[0]] - mask.counts[fg[0]]
+                last[i] = mask.ends[fg[-1]] - 1
+        return first, last
+
+    first_a, last_a = extents(masks_a)
+    first_b, last_b = extents(masks_b)
+    areas_a = np.array([mask.area for mask in masks_a])
+    areas_b = np.array([mask.area for mask in masks_b])
+    overlapping = (first_a[:, None] <= last_b[None, :]) & (first_b[None, :] <= last_a[:, None])
+
+    for i, j in zip(*np.nonzero(overlapping)):
+        intersection = masks_a[i].intersection(masks_b[j])
+        if iscrowd is not None and iscrowd[j]:
+            denominator = areas_a[i]
+        else:
+            denominator = areas_a[i] + areas_b[j] - intersection
+        ious[i, j] = intersection / denominator if denominator else 0.0
+    return ious
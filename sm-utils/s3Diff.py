@@ -0,0 +1,304 @@
+import csv
+import gzip
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Sequence, Union
+from urllib.parse import unquote_plus
+
+from .s3Utils import (
+    S3Location,
+    copy_file_in_s3,
+    delete_file_in_s3,
+    iter_s3_objects,
+    read_file_from_s3,
+    resolve_s3_prefix,
+)
+
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+DEFAULT_INVENTORY_SCHEMA = 'Bucket, Key, Size, LastModifiedDate, ETag'
+
+MAX_COPY_OBJECT_SIZE = 5 * 1024 ** 3
+
+
+class S3DiffEntry:
+    """One key of a prefix diff.
+
+    `status` is relative to bringing the destination in line with the source:
+      - added: only in the source
+      - removed: only in the destination
+      - changed: in both, with a different size or ETag
+      - unchanged: in both and equal (only reported on request)
+
+    `src` and `dest` are the S3Locations of the key under either prefix, so
+    they can be passed straight to copy_file_in_s3, delete_file_in_s3 or
+    read_file_from_s3. `src_obj` and `dest_obj` are the listed objects, None
+    on the side the key is missing from.
+    """
+    __slots__ = ('status', 'key', 'src', 'dest', 'src_obj', 'dest_obj')
+
+    def __init__(self, status: str, key: str, src: S3Location, dest: S3Location, src_obj: dict, dest_obj: dict):
+        self.status = status
+        self.key = key
+        self.src = src
+        self.dest = dest
+        self.src_obj = src_obj
+        self.dest_obj = dest_obj
+
+    def __repr__(self):
+        return f'S3DiffEntry({self.status!r}, {self.key!r})'
+
+
+def iter_inventory_objects(
+    fileobj,
+    schema: str = DEFAULT_INVENTORY_SCHEMA,
+    file_format: str = 'CSV',
+) -> Iterator[dict]:
+    """Reads an S3 Inventory data file as listed objects ({'Key', 'Size', 'ETag', ...}).
+
+    Rows are yielded in file order, which is not key order; read whole
+    reports with iter_inventory_manifest.
+
+    Parameters
+    ----------
+    fileobj : seekable binary file object or bytes,
+        Inventory data file, gzipped CSV or Parquet.
+
+    schema : str, default 'Bucket, Key, Size, LastModifiedDate, ETag'
+        `fileSchema` from the inventory manifest.json, giving the CSV columns.
+
+    file_format : str, default 'CSV'
+        `fileFormat` from the manifest, 'CSV' or 'Parquet'.
+    """
+    if isinstance(fileobj, bytes):
+        fileobj = io.BytesIO(fileobj)
+
+    if file_format.lower() == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(fileobj).iter_batches():
+            for row in batch.to_pylist():
+                yield _inventory_row(row)
+        return
+
+    fields = [field.strip() for field in schema.split(',')]
+    if fileobj.read(2) == b'\x1f\x8b':
+        fileobj.seek(0)
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    else:
+        fileobj.seek(0)
+    for row in csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8')):
+        yield _inventory_row(dict(zip(fields, row)), unquote_key=True)
+
+
+def iter_inventory_manifest(
+    s3_client,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    key: str = None,
+    sort: bool = True,
+) -> Iterator[dict]:
+    """Reads every data file of an S3 Inventory report as listed objects.
+
+    Inventory reports are split over the data files listed in their
+    manifest.json, and rows are not in key order within or across them,
+    while diff_s3_prefixes needs key order. With `sort` (the default) all
+    rows are loaded and sorted before the first one is yielded, which needs
+    memory for the whole report. Without it the files are chained in
+    manifest order, and the diff fails on the first out-of-order key.
+
+    Must provide at least one of the following combinations:
+      - s3_uri (of manifest.json)
+      - bucket_name and key
+    """
+    manifest = json.loads(read_file_from_s3(s3_client, s3_uri=s3_uri, bucket_name=bucket_name, key=key))
+    file_format = manifest.get('fileFormat', 'CSV')
+    if file_format.lower() not in ('csv', 'parquet'):
+        raise ValueError(f'Unsupported inventory format {file_format!r}, expected CSV or Parquet')
+    data_bucket = manifest['destinationBucket'].rsplit(':', 1)[-1]
+
+    def rows():
+        for data_file in manifest['files']:
+            data = read_file_from_s3(s3_client, bucket_name=data_bucket, key=data_file['key'])
+            yield from iter_inventory_objects(data, manifest.get('fileSchema', DEFAULT_INVENTORY_SCHEMA), file_format)
+
+    if not sort:
+        yield from rows()
+        return
+    yield from sorted(rows(), key=lambda obj: obj['Key'])
+
+
+def _inventory_row(row: dict, unquote_key: bool = False) -> dict:
+    """Normalises an inventory row to the list_objects_v2 shape"""
+    key = row.get('Key') or row.get('key')
+    obj = {'Key': unquote_plus(key) if unquote_key else key}
+    size = row.get('Size', row.get('size'))
+    if size not in (None, ''):
+        obj['Size'] = int(size)
+    etag = row.get('ETag', row.get('e_tag'))
+    if etag:
+        obj['ETag'] = '"' + etag.strip('"') + '"'
+    return obj
+
+
+def _relative_objects(objects: Iterable[dict], prefix: str, side: str) -> Iterator:
+    """Yields (relative key, object) in key order, failing on unsorted input"""
+    previous = None
+    for obj in objects:
+        key = obj['Key']
+        if not key.startswith(prefix):
+            continue
+        if previous is not None and key <= previous:
+            raise ValueError(f'{side} objects are not sorted by key: {key!r} after {previous!r}')
+        previous = key
+        yield key[len(prefix):], obj
+
+
+def _etag(obj: dict) -> str:
+    return obj.get('ETag', '').strip('"')
+
+
+def _etag_parts(etag: str) -> int:
+    """Part count of a multipart ETag ('<md5>-<parts>'), 0 for a single-part one"""
+    return int(etag.rsplit('-', 1)[1]) if '-' in etag else 0
+
+
+def diff_s3_prefixes(
+    s3_client,
+    src_s3_uri: Union[str, S3Location] = None,
+    dest_s3_uri: Union[str, S3Location] = None,
+    src_bucket: str = None,
+    src_prefix: str = None,
+    dest_bucket: str = None,
+    dest_prefix: str = None,
+    src_objects: Iterable[dict] = None,
+    dest_objects: Iterable[dict] = None,
+    compare_etag: bool = True,
+    include_unchanged: bool = False,
+) -> Iterator[S3DiffEntry]:
+    """Compares two prefixes with a streaming merge join over their sorted listings.
+
+    Both listings are consumed page by page in key order, so time is linear
+    and memory constant in the number of keys. Keys are matched by their
+    path relative to each prefix.
+
+    Must provide at least one of the following combinations for each side:
+      - src_s3_uri / dest_s3_uri
+      - src_bucket and src_prefix / dest_bucket and dest_prefix
+
+    Parameters
+    ----------
+    src_objects, dest_objects : Iterable[dict], default None
+        Objects to use instead of listing that side, e.g. from
+        iter_inventory_manifest. Must be sorted by key: entries are yielded
+        as the join advances, so an out-of-order key raises ValueError only
+        after earlier entries were produced.
+
+    compare_etag : bool, default True
+        Also flag keys whose ETags differ. ETags depend on how an object was
+        uploaded: a multipart upload gets `<md5 of part md5s>-<parts>`, and
+        apply_s3_diff's copies are single-part up to 5 GB. When the two ETags
+        are not of the same form (single-part against multipart, or a
+        different part count) only the sizes are compared, so applied diffs
+        converge. Disable when both sides are multipart with the same part
+        count but a different part size.
+
+    include_unchanged : bool, default False
+        Also yield keys that are equal on both sides.
+    """
+    src = resolve_s3_prefix(src_s3_uri, src_bucket, src_prefix)
+    dest = resolve_s3_prefix(dest_s3_uri, dest_bucket, dest_prefix)
+
+    if src_objects is None:
+        src_objects = iter_s3_objects(s3_client, s3_uri=src)
+    if dest_objects is None:
+        dest_objects = iter_s3_objects(s3_client, s3_uri=dest)
+
+    def entry(status, key, src_obj, dest_obj):
+        return S3DiffEntry(
+            status, key,
+            S3Location(src.bucket, src.key + key),
+            S3Location(dest.bucket, dest.key + key),
+            src_obj, dest_obj,
+        )
+
+    src_iter = _relative_objects(src_objects, src.key, 'Source')
+    dest_iter = _relative_objects(dest_objects, dest.key, 'Destination')
+    src_item = next(src_iter, None)
+    dest_item = next(dest_iter, None)
+
+    while src_item is not None or dest_item is not None:
+        if dest_item is None or (src_item is not None and src_item[0] < dest_item[0]):
+            yield entry(ADDED, src_item[0], src_item[1], None)
+            src_item = next(src_iter, None)
+        elif src_item is None or dest_item[0] < src_item[0]:
+            yield entry(REMOVED, dest_item[0], None, dest_item[1])
+            dest_item = next(dest_iter, None)
+        else:
+            (key, src_obj), (_, dest_obj) = src_item, dest_item
+            changed = src_obj.get('Size') != dest_obj.get('Size')
+            if compare_etag and not changed:
+                src_etag, dest_etag = _etag(src_obj), _etag(dest_obj)
+                # ETags written with a different part layout never match, even for equal content
+                if _etag_parts(src_etag) == _etag_parts(dest_etag):
+                    changed = src_etag != dest_etag
+            if changed:
+                yield entry(CHANGED, key, src_obj, dest_obj)
+            elif include_unchanged:
+                yield entry(UNCHANGED, key, src_obj, dest_obj)
+            src_item = next(src_iter, None)
+            dest_item = next(dest_iter, None)
+
+
+def apply_s3_diff(
+    s3_client,
+    entries: Iterable[S3DiffEntry],
+    delete: bool = False,
+    max_workers: int = 16,
+) -> Sequence:
+    """Syncs the destination from diff entries: copies added and changed keys
+    and, with `delete`, deletes removed ones.
+
+    Objects up to 5 GB are copied with CopyObject, larger ones (or those
+    listed without a size) with a managed multipart copy.
+
+    Entries are applied in batches as they arrive. If the diff stream fails,
+    e.g. on unsorted inventory input, the batches already applied stay
+    applied, so pass sorted listings (iter_inventory_manifest sorts them).
+
+    Returns
+    -------
+    List of (entry, exception) pairs for the operations that failed.
+    """
+    def apply(entry):
+        try:
+            if entry.status in (ADDED, CHANGED):
+                size = entry.src_obj.get('Size')
+                if size is not None and size <= MAX_COPY_OBJECT_SIZE:
+                    copy_file_in_s3(s3_client, org_s3_uri=entry.src, dest_s3_uri=entry.dest)
+                else:
+                    # CopyObject is limited to 5 GB, larger objects need a multipart copy
+                    s3_client.copy(
+                        {'Bucket': entry.src.bucket, 'Key': entry.src.key}, entry.dest.bucket, entry.dest.key,
+                    )
+            elif entry.status == REMOVED and delete:
+                delete_file_in_s3(s3_client, s3_uri=entry.dest)
+        except Exception as e:
+            return entry, e
+
+    errors = []
+    entries = iter(entries)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Submit in bounded batches so a long diff stream is never held in memory
+        while True:
+            batch = list(islice(entries, max_workers * 64))
+            if not batch:
+                break
+            errors.extend(error for error in executor.map(apply, batch) if error is not None)
+    return errors
@@ -1,18 +1,242 @@
 import io
+import itertools
+import json
 import os
 import hashlib
-from typing import List
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence, Union
 from xml.dom import ValidationErr
 
+from .telemetry import IOEvent, track
+
+
+OBJECT_COMBINATIONS = """Please provide at least one of the following combinations:
+          - s3_uri
+          - bucket_name and key
+          - bucket_name and prefix and filename
+        """
+
+PREFIX_COMBINATIONS = """Please provide at least one of the following combinations:
+          - s3_uri
+          - bucket_name and prefix
+        """
+
+ORIGIN_COMBINATIONS = """Please provide at least one of the following combinations for originating source:
+          - org_s3_uri
+          - org_bucket and org_key
+          - org_bucket and org_prefix and org_filename
+        """
+
+DESTINATION_COMBINATIONS = """Please provide at least one of the following combinations for destination:
+          - dest_s3_uri
+          - dest_bucket and dest_key
+          - dest_bucket and dest_prefix and dest_filename
+        """
+
+
+class S3Location:
+    """Immutable bucket/key pair parsed once from an s3 uri.
+
+    Hashable, so it can be used as a dictionary or cache key, and accepted
+    anywhere an `s3_uri` string is accepted in this module.
+
+    Parameters
+    ----------
+    bucket : str,
+        Bucket name.
+
+    key : str, default ''
+        Object key or prefix inside the bucket.
+    """
+    __slots__ = ('bucket', 'key')
+
+    def __init__(self, bucket: str, key: str = ''):
+        if not bucket:
+            raise ValueError('S3Location requires a bucket name')
+        object.__setattr__(self, 'bucket', bucket)
+        object.__setattr__(self, 'key', key or '')
+
+    def __setattr__(self, name, value):
+        raise AttributeError('S3Location is immutable')
+
+    def __reduce__(self):
+        # pickle and copy would otherwise restore the slots through __setattr__
+        return (S3Location, (self.bucket, self.key))
+
+    @classmethod
+    def from_uri(cls, s3_uri: Union[str, 'S3Location']) -> 'S3Location':
+        """Parses `s3://bucket/key` into a S3Location"""
+        if isinstance(s3_uri, S3Location):
+            return s3_uri
+        if not s3_uri.startswith('s3://'):
+            raise ValueError(f'Not an s3 uri: {s3_uri!r}')
+        bucket, _, key = s3_uri[len('s3://'):].partition('/')
+        return cls(bucket, key)
+
+    @property
+    def uri(self) -> str:
+        return f's3://{self.bucket}/{self.key}'
+
+    def join(self, *parts: str) -> 'S3Location':
+        """Returns a new location with `parts` appended to the key"""
+        key = '/'.join([self.key.rstrip('/')] + [p.strip('/') for p in parts])
+        return S3Location(self.bucket, key.lstrip('/'))
+
+    def __eq__(self, other):
+        if not isinstance(other, S3Location):
+            return NotImplemented
+        return self.bucket == other.bucket and self.key == other.key
+
+    def __hash__(self):
+        return hash((self.bucket, self.key))
+
+    def __repr__(self):
+        return f'S3Location({self.bucket!r}, {self.key!r})'
+
+    def __str__(self):
+        return self.uri
+
+
+def resolve_s3_object(
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    key: str = None,
+    prefix: str = None,
+    filename: str = None,
+    error_message: str = OBJECT_COMBINATIONS,
+) -> S3Location:
+    """Resolves any of the supported object argument combinations to a S3Location.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and key
+      - bucket_name and prefix and filename
+    """
+    if s3_uri:
+        return S3Location.from_uri(s3_uri)
+    if bucket_name and key:
+        return S3Location(bucket_name, key)
+    if bucket_name and prefix and filename:
+        return S3Location(bucket_name, prefix.strip('/') + '/' + filename.strip('/'))
+    raise NameError(error_message)
+
+
+def resolve_s3_prefix(
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+) -> S3Location:
+    """Resolves any of the supported folder argument combinations to a S3Location.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+    """
+    if s3_uri:
+        return S3Location.from_uri(s3_uri)
+    if bucket_name and prefix:
+        return S3Location(bucket_name, prefix)
+    raise NameError(PREFIX_COMBINATIONS)
+
+
+_client_pool = {}
+_client_pool_lock = threading.Lock()
+
+
+def get_s3_client(
+    max_concurrency: int = 10,
+    region_name: str = None,
+    profile_name: str = None,
+    max_attempts: int = 10,
+    session = None,
+):
+    """Returns a s3 client whose connection pool fits `max_concurrency` threads.
+
+    botocore keeps 10 connections per client by default, so more concurrent
+    threads than that queue on the pool ("Connection pool is full"). Clients
+    are created once per (profile, region, concurrency, attempts) and shared;
+    boto3 clients are thread-safe, sessions are not, so creation is locked.
+
+    Parameters
+    ----------
+    max_concurrency : int, default 10
+        Number of requests expected to be in flight at once.
+
+    region_name : str, default None
+
+    profile_name : str, default None
+
+    max_attempts : int, default 10
+        Total attempts per request, retried with adaptive rate limiting.
+
+    session : boto3 Session, default None
+        Create the client from this session instead of the pool.
+    """
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=max(int(max_concurrency), 10),
+        retries={'max_attempts': max_attempts, 'mode': 'adaptive'},
+    )
+    if session is not None:
+        return session.client('s3', region_name=region_name, config=config)
+
+    pool_key = (profile_name, region_name, config.max_pool_connections, max_attempts)
+    with _client_pool_lock:
+        client = _client_pool.get(pool_key)
+        if client is None:
+            session = boto3.session.Session(profile_name=profile_name, region_name=region_name)
+            client = session.client('s3', config=config)
+            _client_pool[pool_key] = client
+    return client
+
+
+@contextmanager
+def _count_retries(s3_client, event, bucket: str, key: str = None, prefix: str = None):
+    """Adds the botocore retries of the requests for `key` (or below `prefix`)
+    to `event`, for managed transfers whose responses are not returned.
+
+    Only active while telemetry is recording. Requests are matched on their
+    parameters when they are made, so concurrent calls for the same key on
+    one client may be attributed to either event.
+    """
+    if not isinstance(event, IOEvent):
+        yield
+        return
+    lock = threading.Lock()
+
+    def match_request(params, context, **kwargs):
+        if params.get('Bucket') == bucket and (
+            params.get('Key') == key if prefix is None else params.get('Key', '').startswith(prefix)
+        ):
+            context.setdefault('smutils_event', event)
+
+    def count(parsed, context, **kwargs):
+        if context.get('smutils_event') is event:
+            with lock:
+                event.retries += parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+
+    events = s3_client.meta.events
+    events.register('before-parameter-build.s3', match_request)
+    events.register('after-call.s3', count)
+    try:
+        yield
+    finally:
+        events.unregister('before-parameter-build.s3', match_request)
+        events.unregister('after-call.s3', count)
+
 
 def upload_file_to_s3(
     s3_client,
     file_bytes: bytes,
-    s3_uri: str = None,
-    bucket_name: str = None, 
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
     key: str = None,
     prefix: str = None,
     filename: str = None,
+    checksum_algorithm: str = None,
 ) -> None:
     """Uploads a bytefile object to s3.
 
@@ -20,30 +244,31 @@ def upload_file_to_s3(
       - s3_uri
       - bucket_name and key
       - bucket_name and prefix and filename
+
+    Parameters
+    ----------
+    checksum_algorithm : str, default None
+        'CRC32', 'CRC32C', 'SHA1' or 'SHA256'. The checksum is computed while
+        the body is sent and s3 rejects the upload if the stored content does
+        not match it.
     """
-    if s3_uri or (bucket_name and key) or (bucket_name and prefix and filename):
-        if s3_uri:
-            bucket_name = s3_uri.split('/')[2]
-            key = '/'.join(s3_uri.split('/')[3:])
-        elif prefix and filename:
-            key = prefix.strip('/') + '/' + filename.strip('/')
-    else:
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and key
-          - bucket_name and prefix and filename
-        """)
+    location = resolve_s3_object(s3_uri, bucket_name, key, prefix, filename)
+    extra_args = {'ChecksumAlgorithm': checksum_algorithm} if checksum_algorithm else None
 
-    s3_client.upload_fileobj(io.BytesIO(file_bytes), bucket_name, key)
+    with track('s3.upload') as event, _count_retries(s3_client, event, location.bucket, location.key):
+        s3_client.upload_fileobj(io.BytesIO(file_bytes), location.bucket, location.key, ExtraArgs=extra_args)
+        event.requests = 1
+        event.bytes = len(file_bytes)
 
 
 def read_file_from_s3(
     s3_client,
-    s3_uri: str = None,
+    s3_uri: Union[str, S3Location] = None,
     bucket_name: str = None,
     key: str = None,
     prefix: str = None,
-    filename: str = None
+    filename: str = None,
+    verify: bool = False,
 ) -> bytes:
     """Reads a file from s3 and returns as bytes object.
 
@@ -51,34 +276,56 @@ def read_file_from_s3(
       - s3_uri
       - bucket_name and key
       - bucket_name and prefix and filename
+
+    Parameters
+    ----------
+    verify : bool, default False
+        Check the content against the object's ETag (and additional checksum,
+        if it was uploaded with one) while it streams in, raising IOError on a
+        mismatch. ETags of SSE-KMS and SSE-C objects are not content hashes and
+        are not checked.
     """
-    if s3_uri or (bucket_name and key) or (bucket_name and prefix and filename):
-        if s3_uri:
-            bucket_name = s3_uri.split('/')[2]
-            key = '/'.join(s3_uri.split('/')[3:])
-        elif prefix and filename:
-            key = prefix.strip('/') + '/' + filename.strip('/')
-    else:
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and key
-          - bucket_name and prefix and filename
-        """)
+    location = resolve_s3_object(s3_uri, bucket_name, key, prefix, filename)
+
+    with track('s3.read') as event:
+        file_bytes = io.BytesIO()
+        if not verify:
+            with _count_retries(s3_client, event, location.bucket, location.key):
+                s3_client.download_fileobj(location.bucket, location.key, file_bytes)
+            event.requests = 1
+            event.bytes = file_bytes.tell()
+            return file_bytes.getvalue()
 
-    file_bytes = io.BytesIO()
-    s3_client.download_fileobj(bucket_name, key, file_bytes)
+        # ChecksumMode makes botocore validate additional checksums as the body is read
+        resp = s3_client.get_object(Bucket=location.bucket, Key=location.key, ChecksumMode='ENABLED')
+        event.add_response(resp)
+        hasher = None
+        if _etag_is_md5(resp):
+            part_sizes = _multipart_part_sizes(s3_client, location, resp['ETag'])
+            if part_sizes is None or sum(part_sizes) == resp['ContentLength']:
+                hasher = _ETagHasher(part_sizes)
+        for chunk in resp['Body'].iter_chunks(1024 * 1024):
+            file_bytes.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+        event.bytes = file_bytes.tell()
+
+    if file_bytes.tell() != resp['ContentLength']:
+        raise IOError(f'Truncated read of {location}: {file_bytes.tell()} of {resp["ContentLength"]} bytes')
+    if hasher is not None and hasher.etag() != resp['ETag']:
+        raise IOError(f'ETag mismatch for {location}: expected {resp["ETag"]}, got {hasher.etag()}')
     return file_bytes.getvalue()
 
 
 def copy_file_in_s3(
     s3_client,
-    org_s3_uri: str = None,
-    org_bucket: str = None, 
+    org_s3_uri: Union[str, S3Location] = None,
+    org_bucket: str = None,
     org_key: str = None,
     org_prefix: str = None,
     org_filename: str = None,
-    dest_s3_uri: str = None,
-    dest_bucket: str = None, 
+    dest_s3_uri: Union[str, S3Location] = None,
+    dest_bucket: str = None,
     dest_key: str = None,
     dest_prefix: str = None,
     dest_filename: str = None
@@ -94,40 +341,23 @@ def copy_file_in_s3(
       - dest_bucket and dest_key
       - dest_bucket and dest_prefix and dest_filename
     """
-    if org_s3_uri or (org_bucket and org_key) or (org_bucket and org_prefix and org_filename):
-        if org_s3_uri:
-            org_bucket = org_s3_uri.split('/')[2]
-            org_key = '/'.join(org_s3_uri.split('/')[3:])
-        elif org_prefix and org_filename:
-            org_key = org_prefix.strip('/') + '/' + org_filename.strip('/')
-    else:
-        raise NameError("""Please provide at least one of the following combinations for originating source:
-          - org_s3_uri
-          - org_bucket and org_key
-          - org_bucket and org_prefix and org_filename
-        """)
-
-    if dest_s3_uri or (dest_bucket and dest_key) or (dest_bucket and dest_prefix and dest_filename):
-        if dest_s3_uri:
-            dest_bucket = dest_s3_uri.split('/')[2]
-            dest_key = '/'.join(dest_s3_uri.split('/')[3:])
-        elif dest_prefix and dest_filename:
-            dest_key = dest_prefix.strip('/') + '/' + dest_filename.strip('/')
-    else:
-        raise NameError("""Please provide at least one of the following combinations for destination:
-          - dest_s3_uri
-          - dest_bucket and dest_key
-          - dest_bucket and dest_prefix and dest_filename
-        """)
+    origin = resolve_s3_object(
+        org_s3_uri, org_bucket, org_key, org_prefix, org_filename,
+        error_message=ORIGIN_COMBINATIONS,
+    )
+    destination = resolve_s3_object(
+        dest_s3_uri, dest_bucket, dest_key, dest_prefix, dest_filename,
+        error_message=DESTINATION_COMBINATIONS,
+    )
 
-    copy_source = {'Bucket': org_bucket, 'Key': org_key}
-    return s3_client.copy_object(Bucket=dest_bucket, Key=dest_key, CopySource=copy_source)
+    copy_source = {'Bucket': origin.bucket, 'Key': origin.key}
+    return s3_client.copy_object(Bucket=destination.bucket, Key=destination.key, CopySource=copy_source)
 
 
 def delete_file_in_s3(
     s3_client,
-    s3_uri: str = None,
-    bucket_name: str = None, 
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
     key: str = None,
     prefix: str = None,
     filename: str = None
@@ -139,31 +369,20 @@ def delete_file_in_s3(
       - bucket_name and key
       - bucket_name and prefix and filename
     """
-    if s3_uri or (bucket_name and key) or (bucket_name and prefix and filename):
-        if s3_uri:
-            bucket_name = s3_uri.split('/')[2]
-            key = '/'.join(s3_uri.split('/')[3:])
-        elif prefix and filename:
-            key = prefix.strip('/') + '/' + filename.strip('/')
-    else:
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and key
-          - bucket_name and prefix and filename
-        """)
+    location = resolve_s3_object(s3_uri, bucket_name, key, prefix, filename)
 
-    return s3_client.delete_object(Bucket=bucket_name, Key=key)
+    return s3_client.delete_object(Bucket=location.bucket, Key=location.key)
 
 
 def move_file_in_s3(
     s3_client,
-    org_s3_uri: str = None,
-    org_bucket: str = None, 
+    org_s3_uri: Union[str, S3Location] = None,
+    org_bucket: str = None,
     org_key: str = None,
     org_prefix: str = None,
     org_filename: str = None,
-    dest_s3_uri: str = None,
-    dest_bucket: str = None, 
+    dest_s3_uri: Union[str, S3Location] = None,
+    dest_bucket: str = None,
     dest_key: str = None,
     dest_prefix: str = None,
     dest_filename: str = None
@@ -181,13 +400,13 @@ def move_file_in_s3(
     """
     copy_resp = copy_file_in_s3(
         s3_client,
-        s3_uri = org_s3_uri,
-        bucket_name = org_bucket, 
-        key = org_key,
-        prefix = org_prefix,
+        org_s3_uri = org_s3_uri,
+        org_bucket = org_bucket,
+        org_key = org_key,
+        org_prefix = org_prefix,
         org_filename = org_filename,
         dest_s3_uri = dest_s3_uri,
-        dest_bucket = dest_bucket, 
+        dest_bucket = dest_bucket,
         dest_key = dest_key,
         dest_prefix = dest_prefix,
         dest_filename = dest_filename
@@ -195,56 +414,65 @@ def move_file_in_s3(
 
     delete_resp = delete_file_in_s3(
         s3_client,
-        org_s3_uri = org_s3_uri,
-        org_bucket = org_bucket, 
-        org_key = org_key,
-        org_prefix = org_prefix,
+        s3_uri = org_s3_uri,
+        bucket_name = org_bucket,
+        key = org_key,
+        prefix = org_prefix,
         filename = org_filename,
     )
 
     return copy_resp, delete_resp
 
 
-def list_s3_objects(
+def iter_s3_objects(
     s3_client,
-    s3_uri: str = None,
-    bucket_name: str = None, 
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
     prefix: str = None,
-) -> List:
-    """Lists files in s3.
+) -> Iterator[dict]:
+    """Yields listed files page by page, in s3's lexicographic key order,
+    without holding the full listing in memory.
 
     Must provide at least one of the following combinations:
       - s3_uri
       - bucket_name and prefix
     """
-    if s3_uri:
-        bucket_name = s3_uri.split('/')[2]
-        prefix = '/'.join(s3_uri.split('/')[3:])
-    elif not (bucket_name and prefix):
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and prefix
-        """)
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
 
-    response_list = []
     ContinuationToken = None
     while True:
-        if ContinuationToken:
-            resp = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, ContinuationToken=ContinuationToken)
-        else:
-            resp = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
+        with track('s3.list') as event:
+            if ContinuationToken:
+                resp = s3_client.list_objects_v2(Bucket=location.bucket, Prefix=location.key, ContinuationToken=ContinuationToken)
+            else:
+                resp = s3_client.list_objects_v2(Bucket=location.bucket, Prefix=location.key)
+            event.add_response(resp)
 
         if 'Contents' in resp:
-            response_list.extend(resp['Contents'])
+            yield from resp['Contents']
         if not resp['IsTruncated']:
             break
         ContinuationToken = resp['NextContinuationToken']
-    return response_list
+
+
+def list_s3_objects(
+    s3_client,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+) -> List:
+    """Lists files in s3.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+    """
+    return list(iter_s3_objects(s3_client, s3_uri, bucket_name, prefix))
 
 
 def list_s3_object_versions(
     s3_client,
-    s3_uri: str = None,
+    s3_uri: Union[str, S3Location] = None,
     bucket_name: str = None,
     prefix: str = None,
 ) -> List:
@@ -254,14 +482,8 @@ def list_s3_object_versions(
       - s3_uri
       - bucket_name and prefix
     """
-    if s3_uri:
-        bucket_name = s3_uri.split('/')[2]
-        prefix = '/'.join(s3_uri.split('/')[3:])
-    elif not (bucket_name and prefix):
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and prefix
-        """)
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    bucket_name, prefix = location.bucket, location.key
 
     response_list = []
     KeyMarker, VersionIdMarker = None, None
@@ -290,7 +512,7 @@ def list_s3_object_versions(
 
 def delete_folder_in_s3(
     s3_client,
-    s3_uri: str = None,
+    s3_uri: Union[str, S3Location] = None,
     bucket_name: str = None,
     prefix: str = None,
 ) -> bytes:
@@ -300,28 +522,16 @@ def delete_folder_in_s3(
       - s3_uri
       - bucket_name and prefix
     """
-    if s3_uri:
-        bucket_name = s3_uri.split('/')[2]
-        prefix = '/'.join(s3_uri.split('/')[3:])
-    elif not (bucket_name and prefix):
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and prefix
-        """)
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
 
-    listed_files = list_s3_objects(
-        s3_client,
-        s3_uri = s3_uri,
-        bucket_name = bucket_name,
-        prefix = prefix,
-    )
+    listed_files = list_s3_objects(s3_client, s3_uri=location)
     files_to_delete = [{'Key': obj['Key']} for obj in listed_files]
 
     success = []
     errors = []
     for i in range(0, len(files_to_delete), 1000):
         resp = s3_client.delete_objects(
-            Bucket=bucket_name,
+            Bucket=location.bucket,
             Delete={
                 'Objects': files_to_delete[i:i+1000],
             }
@@ -336,7 +546,7 @@ def delete_folder_in_s3(
 
 def perminently_delete_folder_in_s3(
     s3_client,
-    s3_uri: str = None,
+    s3_uri: Union[str, S3Location] = None,
     bucket_name: str = None,
     prefix: str = None,
     password: str = None
@@ -352,29 +562,16 @@ def perminently_delete_folder_in_s3(
     elif hashlib.sha224(password.encode('utf-8')).hexdigest() != 'a694b788f26e4613fbdac0fd67c141ace918efa41e9a4ff94116ef43':
         raise ValidationErr('Wrong Password!')
 
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
 
-    if s3_uri:
-        bucket_name = s3_uri.split('/')[2]
-        prefix = '/'.join(s3_uri.split('/')[3:])
-    elif not (bucket_name and prefix):
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and prefix
-        """)
-
-    listed_files = list_s3_object_versions(
-        s3_client,
-        s3_uri = s3_uri,
-        bucket_name = bucket_name,
-        prefix = prefix,
-    )
+    listed_files = list_s3_object_versions(s3_client, s3_uri=location)
     files_to_delete = [{'Key': obj['Key'], 'VersionId': obj['VersionId']} for obj in listed_files]
 
     success = []
     errors = []
     for i in range(0, len(files_to_delete), 1000):
         resp = s3_client.delete_objects(
-            Bucket=bucket_name,
+            Bucket=location.bucket,
             Delete={
                 'Objects': files_to_delete[i:i+1000],
             }
@@ -390,33 +587,551 @@ def perminently_delete_folder_in_s3(
 def download_s3_folder(
     s3_client,
     local_dir,
-    s3_uri: str = None,
+    s3_uri: Union[str, S3Location] = None,
     bucket_name: str = None,
     prefix: str = None,
-) -> None:
+    verify: bool = False,
+    max_workers: int = 1,
+    multipart_threshold: int = 8 * 1024 * 1024,
+    multipart_chunksize: int = 8 * 1024 * 1024,
+    part_concurrency: int = 10,
+) -> dict:
     """Downloads s3 folder to local destination.
 
+    Files are written to a temporary name and renamed once complete, so an
+    interrupted run never leaves truncated files behind.
+
     Must provide at least one of the following combinations:
       - s3_uri
       - bucket_name and prefix
+
+    Parameters
+    ----------
+    verify : bool, default False
+        Download each file with download_file_from_s3, checking its ETag and
+        resuming partially downloaded files part by part.
+
+    max_workers : int, default 1
+        Files downloaded concurrently. Use
+        get_s3_client(max_concurrency=max_workers * part_concurrency) so the
+        connection pool does not become the bottleneck.
+
+    multipart_threshold, multipart_chunksize : int, default 8 MB
+        Files above the threshold are fetched in ranges of the chunk size
+        (the chunk size is the range size for single-part objects with
+        `verify`).
+
+    part_concurrency : int, default 10
+        Ranges of one file fetched concurrently.
+
+    Returns
+    -------
+    dict with the `downloaded` keys and their total `bytes`.
     """
-    if s3_uri:
-        bucket_name = s3_uri.split('/')[2]
-        prefix = '/'.join(s3_uri.split('/')[3:])
-    elif not (bucket_name and prefix):
-        raise NameError("""Please provide at least one of the following combinations:
-          - s3_uri
-          - bucket_name and prefix
-        """)
+    from concurrent.futures import ThreadPoolExecutor
+    from boto3.s3.transfer import TransferConfig
+
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=part_concurrency,
+    )
+    lock = threading.Lock()
 
-    objects = list_s3_objects(s3_client, s3_uri, bucket_name, prefix)
-    for i, obj in enumerate(objects):
-        target = os.path.join(local_dir, os.path.relpath(obj['Key'], prefix))
-        print(f'\rDownloading files {i+1}/{len(objects)}...', end='', flush=True)
+    with track('s3.download_folder') as event, \
+            _count_retries(s3_client, event, location.bucket, prefix=location.key):
+        objects = list_s3_objects(s3_client, s3_uri=location)
+        summary = {'downloaded': [], 'bytes': 0}
+        done = 0
 
-        if not os.path.exists(os.path.dirname(target)):
+        def download(obj):
+            nonlocal done
+            target = os.path.join(local_dir, os.path.relpath(obj['Key'], location.key))
             os.makedirs(os.path.dirname(target), exist_ok=True)
-        if obj['Key'][-1] == '/':
-            continue
+            if obj['Key'][-1] != '/':
+                if verify:
+                    download_file_from_s3(
+                        s3_client, target, s3_uri=S3Location(location.bucket, obj['Key']),
+                        part_size=multipart_chunksize, max_workers=part_concurrency,
+                    )
+                else:
+                    s3_client.download_file(location.bucket, obj['Key'], target + '.part', Config=transfer_config)
+                    os.replace(target + '.part', target)
+            with lock:
+                done += 1
+                if obj['Key'][-1] != '/':
+                    summary['downloaded'].append(obj['Key'])
+                    summary['bytes'] += obj['Size']
+                print(f'\rDownloading files {done}/{len(objects)}...', end='', flush=True)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Submit in bounded batches, as apply_s3_diff, instead of one future per object up front
+            for start in range(0, len(objects), max_workers * 64):
+                for _ in executor.map(download, objects[start:start + max_workers * 64]):
+                    pass
+        event.requests = len(summary['downloaded'])
+        event.bytes = summary['bytes']
+    return summary
+
+
+def _scan_local_files(local_dir):
+    """Yields (path, size) for every file below local_dir using os.scandir"""
+    stack = [local_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path, entry.stat().st_size
+
+
+class _ETagHasher:
+    """Incremental s3 ETag: MD5 of the content, or of the part MD5s when
+    `part_sizes` is given (multipart uploads)"""
+
+    def __init__(self, part_sizes: Union[int, Sequence[int]] = None):
+        self.multipart = part_sizes is not None
+        if isinstance(part_sizes, int):
+            part_sizes = itertools.repeat(part_sizes)
+        self._sizes = iter(part_sizes or ())
+        self._current = next(self._sizes, None)
+        self.part_digests = []
+        self._md5 = hashlib.md5()
+        self._part_bytes = 0
+
+    def update(self, data: bytes) -> None:
+        view = memoryview(data)
+        while self._current is not None and self._part_bytes + len(view) >= self._current:
+            split = self._current - self._part_bytes
+            self._md5.update(view[:split])
+            self.part_digests.append(self._md5.digest())
+            self._md5 = hashlib.md5()
+            self._part_bytes = 0
+            self._current = next(self._sizes, None)
+            view = view[split:]
+        self._md5.update(view)
+        self._part_bytes += len(view)
+
+    def etag(self) -> str:
+        if not self.multipart:
+            return '"' + self._md5.hexdigest() + '"'
+        digests = self.part_digests
+        if self._part_bytes or not digests:
+            digests = digests + [self._md5.digest()]
+        return '"' + hashlib.md5(b''.join(digests)).hexdigest() + f'-{len(digests)}"'
+
+
+def _etag_is_md5(response: dict) -> bool:
+    """False for SSE-KMS and SSE-C objects, whose ETags are not content hashes"""
+    return (
+        not response.get('ServerSideEncryption', '').startswith('aws:kms')
+        and 'SSECustomerAlgorithm' not in response
+    )
+
+
+def _multipart_part_sizes(s3_client, location: S3Location, etag: str, max_workers: int = 8) -> List[int]:
+    """Sizes of every part of a multipart object from HeadObject(PartNumber=n),
+    None for single-part objects. Parts need not be the same size."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    if '-' not in etag:
+        return None
+    num_parts = int(etag.strip('"').rsplit('-', 1)[1])
+
+    def part_size(n):
+        return s3_client.head_object(Bucket=location.bucket, Key=location.key, PartNumber=n)['ContentLength']
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, num_parts)) as executor:
+        return list(executor.map(part_size, range(1, num_parts + 1)))
+
+
+def _write_state(path: str, state: dict) -> None:
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def _read_state(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def compute_s3_etag(
+    path: str,
+    part_size: int = 8 * 1024 * 1024,
+    multipart_threshold: int = None,
+) -> str:
+    """Computes the ETag s3 would assign to a local file.
+
+    Single-part uploads get the MD5 of the content, multipart uploads (files
+    of at least `multipart_threshold` bytes, default `part_size`) get the MD5
+    of the concatenated part MD5s suffixed with the part count.
+    """
+    if multipart_threshold is None:
+        multipart_threshold = part_size
+    multipart = os.path.getsize(path) >= multipart_threshold
+
+    hasher = _ETagHasher(part_size if multipart else None)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.etag()
+
+
+def download_file_from_s3(
+    s3_client,
+    local_path: str,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    key: str = None,
+    prefix: str = None,
+    filename: str = None,
+    verify: bool = True,
+    part_size: int = 8 * 1024 * 1024,
+    max_workers: int = 8,
+) -> None:
+    """Downloads a file from s3 with ranged GETs, resuming interrupted downloads.
+
+    Parts are written to `<local_path>.part` while `<local_path>.part.json`
+    records the completed ones and their MD5s, so a rerun only fetches the
+    missing parts. Parts kept from an earlier run are re-hashed from disk
+    and fetched again if they no longer match.
+    The file is renamed to `local_path` once complete and verified. Every
+    GET is conditional on the ETag, so a file changed mid-download fails
+    instead of mixing versions.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and key
+      - bucket_name and prefix and filename
+
+    Parameters
+    ----------
+    verify : bool, default True
+        Check the content against the ETag. Multipart objects are fetched
+        along their original part boundaries (HeadObject per part), so their
+        ETag is rebuilt from the MD5s taken as parts arrive; single-part
+        objects are hashed from disk once complete. Raises IOError on a
+        mismatch and discards the partial download.
+
+    part_size : int, default 8 MB
+        Range size for single-part objects.
+
+    max_workers : int, default 8
+        Parts fetched concurrently.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    location = resolve_s3_object(s3_uri, bucket_name, key, prefix, filename)
+    part_path, state_path = local_path + '.part', local_path + '.part.json'
+
+    with track('s3.download') as event:
+        head = s3_client.head_object(Bucket=location.bucket, Key=location.key)
+        event.add_response(head)
+        size, etag = head['ContentLength'], head['ETag']
+
+        # Multipart objects are fetched along their real part boundaries, so
+        # their ETag can be rebuilt from the part MD5s
+        multipart_sizes = _multipart_part_sizes(s3_client, location, etag, max_workers)
+        if multipart_sizes is not None and sum(multipart_sizes) == size:
+            part_sizes = multipart_sizes
+        else:
+            part_sizes = [min(part_size, size - start) for start in range(0, size, part_size)]
+        offsets = [0]
+        for length in part_sizes[:-1]:
+            offsets.append(offsets[-1] + length)
+        num_parts = len(part_sizes)
+        # Verification is skipped when the part boundaries cannot be confirmed
+        check_etag = verify and _etag_is_md5(head) and (multipart_sizes is None or part_sizes is multipart_sizes)
+
+        state = _read_state(state_path)
+        if (state.get('etag'), state.get('size'), state.get('part_sizes')) != (etag, size, part_sizes) \
+                or not os.path.exists(part_path):
+            state = {'etag': etag, 'size': size, 'part_sizes': part_sizes, 'parts': {}}
+            os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            _write_state(state_path, state)
+        lock = threading.Lock()
+
+        def fetch(n):
+            start, length = offsets[n], part_sizes[n]
+            resp = s3_client.get_object(
+                Bucket=location.bucket, Key=location.key, Range=f'bytes={start}-{start + length - 1}', IfMatch=etag,
+            )
+            data = resp['Body'].read()
+            if len(data) != length:
+                raise IOError(f'Truncated part {n} of {location}: {len(data)} of {length} bytes')
+            with open(part_path, 'r+b') as f:
+                f.seek(start)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # The data is on disk before the state records it, so resuming never trusts a missing part
+            with lock:
+                state['parts'][str(n)] = hashlib.md5(data).hexdigest()
+                _write_state(state_path, state)
+                event.add_response(resp)
+                event.bytes += len(data)
+
+        if state['parts']:
+            # Parts kept from an earlier run are re-hashed from disk and fetched again if they changed
+            with open(part_path, 'rb') as f:
+                for n, digest in list(state['parts'].items()):
+                    f.seek(offsets[int(n)])
+                    if hashlib.md5(f.read(part_sizes[int(n)])).hexdigest() != digest:
+                        del state['parts'][n]
+            _write_state(state_path, state)
+
+        pending = [n for n in range(num_parts) if str(n) not in state['parts']]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(fetch, pending):
+                pass
+
+        if check_etag:
+            if multipart_sizes is None:
+                # A single-part ETag is the MD5 of the whole content, hashed in order once every part is on disk
+                hasher = _ETagHasher()
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        hasher.update(chunk)
+                actual = hasher.etag()
+            else:
+                digests = b''.join(bytes.fromhex(state['parts'][str(n)]) for n in range(num_parts))
+                actual = '"' + hashlib.md5(digests).hexdigest() + f'-{num_parts}"'
+            if actual != etag:
+                os.remove(part_path)
+                os.remove(state_path)
+                event.error = 'ETag mismatch'
+                raise IOError(f'ETag mismatch for {location}: expected {etag}, got {actual}')
+
+        os.replace(part_path, local_path)
+        os.remove(state_path)
+
+
+def upload_large_file_to_s3(
+    s3_client,
+    local_path: str,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    key: str = None,
+    prefix: str = None,
+    filename: str = None,
+    part_size: int = 8 * 1024 * 1024,
+    checksum_algorithm: str = 'CRC32',
+    max_workers: int = 4,
+    state_path: str = None,
+) -> None:
+    """Uploads a local file as a multipart upload that resumes after interruptions.
+
+    The upload id and completed parts are kept in `state_path` (default
+    `<local_path>.s3upload.json`); a rerun on the same unchanged file
+    confirms them with ListParts and only sends the missing parts. Each part
+    carries an additional checksum that s3 validates on receipt, its returned
+    ETag is compared with the part MD5 computed from the same read, and the
+    final ETag with the expected multipart ETag, so nothing is read twice.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and key
+      - bucket_name and prefix and filename
+
+    Parameters
+    ----------
+    part_size : int, default 8 MB
+        Raised as needed to stay within s3's 10,000 part limit.
+
+    checksum_algorithm : str, default 'CRC32'
+        'CRC32', 'CRC32C', 'SHA1' or 'SHA256'.
+
+    max_workers : int, default 4
+        Parts uploaded concurrently, each holding `part_size` bytes in memory.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from botocore.exceptions import ClientError
+
+    location = resolve_s3_object(s3_uri, bucket_name, key, prefix, filename)
+    state_path = state_path or local_path + '.s3upload.json'
+    stat = os.stat(local_path)
+    part_size = max(part_size, -(-stat.st_size // 10000))
+    num_parts = max(1, -(-stat.st_size // part_size))
+    identity = {
+        'uri': location.uri, 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+        'part_size': part_size, 'checksum_algorithm': checksum_algorithm,
+    }
+
+    with track('s3.upload') as event:
+        state = _read_state(state_path)
+        if state and all(state.get(k) == v for k, v in identity.items()):
+            try:
+                uploaded = {
+                    str(part['PartNumber']): part['ETag']
+                    for page in s3_client.get_paginator('list_parts').paginate(
+                        Bucket=location.bucket, Key=location.key, UploadId=state['upload_id'],
+                    )
+                    for part in page.get('Parts', [])
+                }
+                state['parts'] = {
+                    n: part for n, part in state['parts'].items() if uploaded.get(n) == part['ETag']
+                }
+            except ClientError:
+                state = {}
+        else:
+            state = {}
+
+        if not state:
+            resp = s3_client.create_multipart_upload(
+                Bucket=location.bucket, Key=location.key, ChecksumAlgorithm=checksum_algorithm,
+            )
+            event.add_response(resp)
+            state = dict(identity, upload_id=resp['UploadId'], parts={})
+            _write_state(state_path, state)
+        lock = threading.Lock()
+
+        def send(n):
+            with open(local_path, 'rb') as f:
+                f.seek((n - 1) * part_size)
+                data = f.read(part_size)
+            resp = s3_client.upload_part(
+                Bucket=location.bucket, Key=location.key, UploadId=state['upload_id'],
+                PartNumber=n, Body=data, ChecksumAlgorithm=checksum_algorithm,
+            )
+            md5 = hashlib.md5(data).hexdigest()
+            if _etag_is_md5(resp) and resp['ETag'].strip('"') != md5:
+                raise IOError(f'ETag mismatch for part {n} of {location}: expected "{md5}", got {resp["ETag"]}')
+            part = {'PartNumber': n, 'ETag': resp['ETag']}
+            checksum_key = 'Checksum' + checksum_algorithm.upper()
+            if checksum_key in resp:
+                part[checksum_key] = resp[checksum_key]
+            with lock:
+                state['parts'][str(n)] = part
+                _write_state(state_path, state)
+                event.add_response(resp)
+                event.bytes += len(data)
+
+        pending = [n for n in range(1, num_parts + 1) if str(n) not in state['parts']]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(send, pending):
+                pass
+
+        parts = [state['parts'][str(n)] for n in range(1, num_parts + 1)]
+        resp = s3_client.complete_multipart_upload(
+            Bucket=location.bucket, Key=location.key, UploadId=state['upload_id'],
+            MultipartUpload={'Parts': parts},
+        )
+        event.add_response(resp)
+        os.remove(state_path)
+
+        if not _etag_is_md5(resp):
+            return
+        digests = b''.join(bytes.fromhex(part['ETag'].strip('"')) for part in parts)
+        expected = '"' + hashlib.md5(digests).hexdigest() + f'-{num_parts}"'
+        if resp['ETag'] != expected:
+            event.error = 'ETag mismatch'
+            raise IOError(f'ETag mismatch for {location}: expected {expected}, got {resp["ETag"]}')
+
+
+def upload_s3_folder(
+    s3_client,
+    local_dir,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+    max_workers: int = 32,
+    multipart_threshold: int = 8 * 1024 * 1024,
+    multipart_chunksize: int = 8 * 1024 * 1024,
+    part_concurrency: int = 4,
+    skip_existing: bool = True,
+) -> dict:
+    """Uploads a local folder to s3, mirroring download_s3_folder.
+
+    Files are streamed from disk (multipart above `multipart_threshold`) by
+    `max_workers` threads. Files whose size and ETag already match the remote
+    object are skipped, and ContentType is set from the file extension. Use
+    get_s3_client(max_concurrency=max_workers * part_concurrency) so the
+    connection pool does not become the bottleneck.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+
+    Returns
+    -------
+    dict with `uploaded`, `skipped` and `errors` lists of keys (errors as
+    (key, exception) pairs), total `bytes` uploaded, `seconds` and `throughput`
+    in bytes per second.
+    """
+    import mimetypes
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from boto3.s3.transfer import TransferConfig
+
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=part_concurrency,
+    )
+
+    remote = {}
+    if skip_existing:
+        remote = {
+            obj['Key']: (obj['Size'], obj['ETag'])
+            for obj in list_s3_objects(s3_client, s3_uri=location)
+        }
+
+    def upload(path_size):
+        path, size = path_size
+        rel_path = os.path.relpath(path, local_dir).replace(os.sep, '/')
+        key = location.join(rel_path).key
+        try:
+            if key in remote and remote[key][0] == size:
+                if remote[key][1] == compute_s3_etag(path, multipart_chunksize, multipart_threshold):
+                    return key, None, None
+            extra_args = {}
+            content_type = mimetypes.guess_type(path)[0]
+            if content_type:
+                extra_args['ContentType'] = content_type
+            s3_client.upload_file(path, location.bucket, key, ExtraArgs=extra_args, Config=transfer_config)
+        except Exception as e:
+            return key, None, e
+        return key, size, None
+
+    summary = {'uploaded': [], 'skipped': [], 'errors': [], 'bytes': 0}
+    start_time = time.perf_counter()
+    files = _scan_local_files(local_dir)
+    done = 0
+    with track('s3.upload_folder') as event, \
+            _count_retries(s3_client, event, location.bucket, prefix=location.key), \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Submit in bounded batches, as apply_s3_diff, so a large tree is never queued whole
+        while True:
+            batch = list(itertools.islice(files, max_workers * 64))
+            if not batch:
+                break
+            for key, nbytes, error in executor.map(upload, batch):
+                done += 1
+                if error is not None:
+                    summary['errors'].append((key, error))
+                elif nbytes is None:
+                    summary['skipped'].append(key)
+                else:
+                    summary['uploaded'].append(key)
+                    summary['bytes'] += nbytes
+                print(f'\rUploading files {done}...', end='', flush=True)
+        event.bytes = summary['bytes']
+        event.requests = len(summary['uploaded'])
+        if summary['errors']:
+            event.error = f"{len(summary['errors'])} failed uploads"
 
-        s3_client.download_file(bucket_name, obj['Key'], target)
+    summary['seconds'] = time.perf_counter() - start_time
+    summary['throughput'] = summary['bytes'] / summary['seconds'] if summary['seconds'] else 0.0
+    print(f"\nUploaded {len(summary['uploaded'])} files ({summary['bytes'] / 1e6:.1f} MB) "
+          f"at {summary['throughput'] / 1e6:.1f} MB/s, skipped {len(summary['skipped'])}, "
+          f"errors {len(summary['errors'])}")
+    return summary
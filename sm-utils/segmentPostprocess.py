@@ -0,0 +1,198 @@
+import numpy as np
+
+from typing import Mapping, Sequence, Tuple, Union
+
+
+def to_class_mask(arr: np.array) -> np.array:
+    """Rounds a float mask, as returned by protobuf_to_numpy_mask, to uint8 class ids"""
+    return np.clip(np.rint(arr), 0, 255).astype(np.uint8)
+
+
+def remap_classes(
+    masks: np.array,
+    mapping: Union[Mapping[int, int], Sequence[int]],
+    default: int = None,
+) -> np.array:
+    """Maps class ids of one or more uint8 masks through a lookup table.
+
+    Parameters
+    ----------
+    masks : Numpy Array,
+        uint8 mask or batch of masks of any shape.
+
+    mapping : dict or Sequence[int],
+        {old: new} pairs, or a full lookup table of up to 256 entries.
+
+    default : int, default None
+        Value for ids missing from a dict mapping. Unmapped ids are kept
+        when None.
+    """
+    if isinstance(mapping, Mapping):
+        lut = np.arange(256, dtype=np.uint8) if default is None else np.full(256, default, dtype=np.uint8)
+        lut[list(mapping.keys())] = list(mapping.values())
+    else:
+        lut = np.arange(256, dtype=np.uint8)
+        lut[:len(mapping)] = mapping
+    return lut[masks]
+
+
+def label_components(mask: np.array, connectivity: int = 1) -> Tuple[np.array, np.array]:
+    """Labels connected components of each class separately.
+
+    Parameters
+    ----------
+    mask : Numpy Array,
+        2D class mask, 0 being background.
+
+    connectivity : int, default 1
+        1 for 4-connectivity, 2 for 8-connectivity.
+
+    Returns
+    -------
+    (labels, label_classes) where labels is an int32 array with 0 for
+    background and 1..n per component, and label_classes[i] is the class of
+    component i (label_classes[0] is 0).
+    """
+    from scipy import ndimage
+
+    structure = ndimage.generate_binary_structure(2, connectivity)
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    label_classes = [0]
+    for c in np.unique(mask):
+        if c == 0:
+            continue
+        class_labels, num = ndimage.label(mask == c, structure=structure)
+        labels[class_labels > 0] = class_labels[class_labels > 0] + len(label_classes) - 1
+        label_classes.extend([c] * num)
+    return labels, np.array(label_classes, dtype=mask.dtype)
+
+
+def region_properties(labels: np.array, num_labels: int = None) -> dict:
+    """Area, centroid and bounding box of every label in one pass.
+
+    Works on component labels from label_components as well as directly on
+    a class mask, giving per-class statistics. Raises ValueError when a
+    label is not below `num_labels`.
+
+    Returns
+    -------
+    dict of arrays indexed by position, for labels present in the image
+    (background 0 excluded):
+      - label: label ids
+      - area: pixel counts
+      - centroid: (y, x) means
+      - bbox: (x1, y1, x2, y2) inclusive boxes, ready for draw_bounding_box
+    """
+    max_label = int(labels.max()) if labels.size else 0
+    if num_labels is None:
+        num_labels = max_label + 1
+    elif max_label >= num_labels:
+        raise ValueError(f'Label {max_label} found, expected labels below num_labels={num_labels}')
+
+    flat = labels.ravel()
+    ys, xs = np.divmod(np.arange(flat.size), labels.shape[1])
+    area = np.bincount(flat, minlength=num_labels)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cy = np.bincount(flat, weights=ys, minlength=num_labels) / area
+        cx = np.bincount(flat, weights=xs, minlength=num_labels) / area
+
+    x1 = np.full(num_labels, labels.shape[1], dtype=np.int64)
+    y1 = np.full(num_labels, labels.shape[0], dtype=np.int64)
+    x2 = np.full(num_labels, -1, dtype=np.int64)
+    y2 = np.full(num_labels, -1, dtype=np.int64)
+    np.minimum.at(x1, flat, xs)
+    np.minimum.at(y1, flat, ys)
+    np.maximum.at(x2, flat, xs)
+    np.maximum.at(y2, flat, ys)
+
+    present = np.flatnonzero(area)
+    present = present[present != 0]
+    return {
+        'label': present,
+        'area': area[present],
+        'centroid': np.stack([cy[present], cx[present]], axis=1),
+        'bbox': np.stack([x1[present], y1[present], x2[present], y2[present]], axis=1),
+    }
+
+
+def remove_small_components(
+    mask: np.array,
+    min_size: int,
+    connectivity: int = 1,
+    fill_value: int = 0,
+) -> np.array:
+    """Sets components smaller than `min_size` pixels to `fill_value`"""
+    labels, _ = label_components(mask, connectivity)
+    small = np.bincount(labels.ravel()) < min_size
+    small[0] = False
+    out = mask.copy()
+    out[small[labels]] = fill_value
+    return out
+
+
+def fill_holes(mask: np.array, classes: Sequence[int] = None) -> np.array:
+    """Fills background holes enclosed by a class with that class.
+
+    Only background (0) pixels are filled, so enclosed regions of other
+    classes are kept.
+    """
+    from scipy import ndimage
+
+    if classes is None:
+        classes = np.unique(mask)
+    out = mask.copy()
+    for c in classes:
+        if c == 0:
+            continue
+        region = mask == c
+        holes = ndimage.binary_fill_holes(region) & ~region & (out == 0)
+        out[holes] = c
+    return out
+
+
+def class_areas(masks: np.array, num_classes: int = None) -> np.array:
+    """Pixel count per class for a mask or a (N, height, width) batch.
+
+    Raises ValueError when a class id is not below `num_classes`.
+
+    Returns
+    -------
+    Array of shape (num_classes,) or (N, num_classes).
+    """
+    batch = masks if masks.ndim == 3 else masks[None]
+    max_class = int(batch.max()) if batch.size else 0
+    if num_classes is None:
+        num_classes = max_class + 1
+    elif max_class >= num_classes:
+        raise ValueError(f'Class {max_class} found, expected class ids below num_classes={num_classes}')
+    offsets = (np.arange(len(batch)) * num_classes)[:, None, None]
+    counts = np.bincount((batch.astype(np.int64) + offsets).ravel(), minlength=len(batch) * num_classes)
+    counts = counts.reshape(len(batch), num_classes)
+    return counts if masks.ndim == 3 else counts[0]
+
+
+def postprocess_masks(
+    masks: np.array,
+    mapping: Union[Mapping[int, int], Sequence[int]] = None,
+    min_size: int = 0,
+    fill: bool = False,
+    connectivity: int = 1,
+) -> np.array:
+    """Cleans up a mask or (N, height, width) batch of endpoint masks.
+
+    Rounds to uint8 class ids, remaps classes, removes components smaller
+    than `min_size` and fills enclosed holes, in that order. The result can
+    be passed to mask_array_to_image.
+    """
+    batch = to_class_mask(masks if masks.ndim == 3 else masks[None])
+    if mapping is not None:
+        batch = remap_classes(batch, mapping)
+
+    out = np.empty_like(batch)
+    for i, mask in enumerate(batch):
+        if min_size:
+            mask = remove_small_components(mask, min_size, connectivity)
+        if fill:
+            mask = fill_holes(mask)
+        out[i] = mask
+    return out if masks.ndim == 3 else out[0]
@@ -0,0 +1,361 @@
+import io
+import json
+import os
+import queue
+import tarfile
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, Sequence, Union
+
+from .s3Utils import S3Location, read_file_from_s3, resolve_s3_prefix, upload_file_to_s3
+from .smUtils import find_mask_attribute
+from .telemetry import track
+
+
+INDEX_FILENAME = 'index.json'
+
+
+def _shard_name(shard_no: int) -> str:
+    return f'shard-{shard_no:06d}.tar'
+
+
+def _shard_index_name(shard_no: int) -> str:
+    return f'shard-{shard_no:06d}.json'
+
+
+def _sample_key(position: int) -> str:
+    return f'{position:08d}'
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes) -> list:
+    """Adds `data` to the tar with fixed metadata and returns its [offset, size]"""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = 0
+    info.mode = 0o644
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+    tar.addfile(info, io.BytesIO(data))
+    padded_size = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+    return [tar.offset - padded_size, len(data)]
+
+
+def _build_shard(
+    s3_client,
+    location: S3Location,
+    shard_no: int,
+    samples: Sequence,
+    image_attribute: str,
+    mask_attribute: str,
+    fetch_concurrency: int,
+) -> int:
+    """Fetches one shard worth of samples, writes them as a tar and uploads it
+    with its index. Returns the number of samples."""
+    def fetch(sample):
+        position, line = sample
+        mask_attr = mask_attribute or find_mask_attribute(line, image_attribute)
+        image_uri, mask_uri = line[image_attribute], line[mask_attr]
+        return (
+            position,
+            line,
+            (os.path.splitext(image_uri)[1], read_file_from_s3(s3_client, s3_uri=image_uri)),
+            (os.path.splitext(mask_uri)[1], read_file_from_s3(s3_client, s3_uri=mask_uri)),
+        )
+
+    members = {}
+    with tempfile.TemporaryFile(mode="w+b") as ftemp:
+        with ThreadPoolExecutor(max_workers=fetch_concurrency) as executor, \
+                tarfile.open(fileobj=ftemp, mode='w', format=tarfile.USTAR_FORMAT) as tar:
+            # A sliding window of futures keeps manifest order, so shards are
+            # byte-identical across runs, and bounds the fetched samples in memory
+            samples = iter(samples)
+            in_flight = deque(executor.submit(fetch, sample) for sample in islice(samples, 2 * fetch_concurrency))
+            while in_flight:
+                position, line, (image_ext, image), (mask_ext, mask) = in_flight.popleft().result()
+                for sample in islice(samples, 1):
+                    in_flight.append(executor.submit(fetch, sample))
+                key = _sample_key(position)
+                members[key] = {
+                    'image' + image_ext: _add_member(tar, f'{key}.image{image_ext}', image),
+                    'mask' + mask_ext: _add_member(tar, f'{key}.mask{mask_ext}', mask),
+                    'json': _add_member(tar, f'{key}.json', json.dumps(line, sort_keys=True).encode('utf-8')),
+                }
+        ftemp.seek(0)
+        s3_client.upload_fileobj(ftemp, location.bucket, location.join(_shard_name(shard_no)).key)
+    upload_file_to_s3(
+        s3_client,
+        json.dumps(members).encode('utf-8'),
+        s3_uri=location.join(_shard_index_name(shard_no)),
+    )
+    return len(members)
+
+
+def build_shards(
+    s3_client,
+    manifest_lines: Sequence[dict],
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+    samples_per_shard: int = 1000,
+    image_attribute: str = 'source-ref',
+    mask_attribute: str = None,
+    max_workers: int = 8,
+    fetch_concurrency: int = 16,
+) -> dict:
+    """Packs image/mask pairs listed in a manifest into tar shards on s3.
+
+    Shards follow the WebDataset layout (`<key>.image.png`, `<key>.mask.png`,
+    `<key>.json` with the manifest line) and are written in manifest order
+    with fixed tar metadata, so the same manifest always produces identical
+    shards. Each shard gets a `shard-NNNNNN.json` index with the byte offset
+    of its members, for random access with read_shard_sample, and a small
+    `index.json` lists the shards.
+
+    Must provide at least one of the following combinations for the output:
+      - s3_uri
+      - bucket_name and prefix
+
+    Parameters
+    ----------
+    manifest_lines : Sequence[dict],
+        Lines as returned by get_manifest_lines.
+
+    samples_per_shard : int, default 1000
+
+    image_attribute : str, default 'source-ref'
+
+    mask_attribute : str, default None
+        Manifest attribute holding the mask uri. Defaults to the first other
+        attribute ending in `-ref`.
+
+    max_workers : int, default 8
+        Number of shards built in parallel.
+
+    fetch_concurrency : int, default 16
+        Number of parallel GETs per shard being built. Up to
+        `max_workers * fetch_concurrency` requests are in flight, so use
+        get_s3_client(max_concurrency=max_workers * fetch_concurrency) to keep
+        the connection pool from becoming the bottleneck.
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+
+    samples = list(enumerate(manifest_lines))
+    shard_samples = [
+        samples[i:i + samples_per_shard]
+        for i in range(0, len(samples), samples_per_shard)
+    ]
+
+    index = {
+        'shards': [_shard_name(shard_no) for shard_no in range(len(shard_samples))],
+        'samples_per_shard': samples_per_shard,
+        'num_samples': len(samples),
+    }
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _build_shard, s3_client, location, shard_no, shard,
+                image_attribute, mask_attribute, fetch_concurrency,
+            )
+            for shard_no, shard in enumerate(shard_samples)
+        ]
+        for i, future in enumerate(futures):
+            future.result()
+            print(f'\rBuilding shards {i+1}/{len(futures)}...', end='', flush=True)
+
+    upload_file_to_s3(
+        s3_client,
+        json.dumps(index).encode('utf-8'),
+        s3_uri = location.join(INDEX_FILENAME),
+    )
+    return index
+
+
+def read_shard_index(
+    s3_client,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+) -> dict:
+    """Reads the shard list written by build_shards.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    return json.loads(read_file_from_s3(s3_client, s3_uri=location.join(INDEX_FILENAME)))
+
+
+def read_shard_members(
+    s3_client,
+    shard_no: int,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+) -> dict:
+    """Reads the index of one shard, mapping each sample key to the
+    [offset, size] of its fields.
+
+    Must provide at least one of the following combinations:
+      - s3_uri
+      - bucket_name and prefix
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    return json.loads(read_file_from_s3(s3_client, s3_uri=location.join(_shard_index_name(shard_no))))
+
+
+def _decode_member(field: str, data: bytes):
+    return json.loads(data) if field == 'json' else data
+
+
+def read_shard_sample(
+    s3_client,
+    index: dict,
+    sample: Union[int, str],
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+    members: dict = None,
+) -> dict:
+    """Reads a single sample from the shards with one ranged GET.
+
+    Parameters
+    ----------
+    index : dict,
+        Index as returned by build_shards or read_shard_index.
+
+    sample : int or str,
+        Position of the sample in the manifest or its shard key.
+
+    members : dict, default None
+        Index of the sample's shard from read_shard_members. Fetched when
+        None, which costs a second GET; pass it when reading many samples
+        from the same shard.
+
+    Returns
+    -------
+    dict mapping each field (e.g. `image.png`, `mask.png`, `json`) to its
+    bytes, with the manifest line decoded under `json`.
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    key = _sample_key(sample) if isinstance(sample, int) else sample
+    shard_no = int(key) // index['samples_per_shard']
+    if members is None:
+        members = read_shard_members(s3_client, shard_no, s3_uri=location)
+    fields = members[key]
+
+    start = min(offset for offset, _ in fields.values())
+    end = max(offset + size for offset, size in fields.values())
+    resp = s3_client.get_object(
+        Bucket=location.bucket,
+        Key=location.join(index['shards'][shard_no]).key,
+        Range=f'bytes={start}-{end - 1}',
+    )
+    data = resp['Body'].read()
+
+    return {
+        field: _decode_member(field, data[offset - start:offset - start + size])
+        for field, (offset, size) in fields.items()
+    }
+
+
+def _stream_shard(s3_client, uri: S3Location, out: queue.Queue, stop: threading.Event) -> None:
+    """Parses a shard straight from the GET body and puts (key, sample) tuples
+    on `out`, then None. Exceptions are put on `out` for the reader to raise."""
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        with track('s3.read') as event:
+            resp = s3_client.get_object(Bucket=uri.bucket, Key=uri.key)
+            event.add_response(resp)
+            key, sample = None, {}
+            with tarfile.open(fileobj=resp['Body'], mode='r|') as tar:
+                for member in tar:
+                    member_key, _, field = member.name.partition('.')
+                    if member_key != key and key is not None:
+                        if not put((key, sample)):
+                            return
+                        sample = {}
+                    key = member_key
+                    sample[field] = _decode_member(field, tar.extractfile(member).read())
+                    event.bytes += member.size
+            if key is not None and not put((key, sample)):
+                return
+        put(None)
+    except Exception as e:
+        put(e)
+
+
+def iterate_shards(
+    s3_client,
+    index: dict,
+    s3_uri: Union[str, S3Location] = None,
+    bucket_name: str = None,
+    prefix: str = None,
+    shards: Sequence[int] = None,
+    prefetch: int = 2,
+    buffer_samples: int = 32,
+) -> Iterator:
+    """Streams samples shard by shard, reading the next shards in the background.
+
+    Shards are parsed as their GET bodies arrive and never held whole, so at
+    most `(prefetch + 1) * buffer_samples` decoded samples are in memory.
+
+    Parameters
+    ----------
+    index : dict,
+        Index as returned by build_shards or read_shard_index.
+
+    shards : Sequence[int], default None
+        Shard numbers to read, e.g. a per-worker split. Defaults to all shards.
+
+    prefetch : int, default 2
+        Number of shards streamed ahead of the one being consumed.
+
+    buffer_samples : int, default 32
+        Samples buffered per shard being streamed.
+
+    Yields
+    ------
+    (key, sample) tuples where sample is a dict like read_shard_sample returns.
+    """
+    location = resolve_s3_prefix(s3_uri, bucket_name, prefix)
+    if shards is None:
+        shards = range(len(index['shards']))
+    uris = [location.join(index['shards'][shard_no]) for shard_no in shards]
+    stop = threading.Event()
+
+    def start(uri):
+        out = queue.Queue(maxsize=buffer_samples)
+        executor.submit(_stream_shard, s3_client, uri, out, stop)
+        return out
+
+    with ThreadPoolExecutor(max_workers=prefetch + 1) as executor:
+        try:
+            pending = [start(uri) for uri in uris[:prefetch + 1]]
+            next_shard = len(pending)
+            while pending:
+                out = pending.pop(0)
+                while True:
+                    item = out.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+                if next_shard < len(uris):
+                    pending.append(start(uris[next_shard]))
+                    next_shard += 1
+        finally:
+            # Unblocks producers when the caller stops iterating early
+            stop.set()
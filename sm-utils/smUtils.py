@@ -5,6 +5,7 @@ import time
 from typing import Sequence
 
 from .s3Utils import read_file_from_s3, upload_file_to_s3
+from .telemetry import track
 
 
 def protobuf_to_numpy_mask(bytes_obj: bytes):
@@ -35,22 +36,28 @@ def deploy_endpoint(sm_client, endpoint_config_name: str = None, endpoint_name:
 
     start_time = time.perf_counter()
 
-    ep_res = sm_client.create_endpoint(
-        EndpointName=endpoint_name, EndpointConfigName=endpoint_config_name
-    )
-    print(ep_res, '\n\n')
-
-    print('Creating Endpoint', end=' ')
-    creating = True
-    while creating:
-        ep_des_res = sm_client.describe_endpoint(EndpointName=endpoint_name)
-        print('.', end='')
-        if ep_des_res["EndpointStatus"] != "Creating":
-            print('!\n')
-            print(f'Endpoint Name: {endpoint_name}')
-            print(f'Endpoint Status: {ep_des_res["EndpointStatus"]}, Time taken: {int(time.perf_counter() - start_time)} sec')
-            creating = False
-        time.sleep(30)
+    with track('sagemaker.deploy_endpoint') as event:
+        ep_res = sm_client.create_endpoint(
+            EndpointName=endpoint_name, EndpointConfigName=endpoint_config_name
+        )
+        event.add_response(ep_res)
+        print(ep_res, '\n\n')
+
+        print('Creating Endpoint', end=' ')
+        creating = True
+        while creating:
+            ep_des_res = sm_client.describe_endpoint(EndpointName=endpoint_name)
+            event.add_response(ep_des_res)
+            print('.', end='')
+            if ep_des_res["EndpointStatus"] != "Creating":
+                print('!\n')
+                print(f'Endpoint Name: {endpoint_name}')
+                print(f'Endpoint Status: {ep_des_res["EndpointStatus"]}, Time taken: {int(time.perf_counter() - start_time)} sec')
+                if ep_des_res["EndpointStatus"] != "InService":
+                    event.error = ep_des_res["EndpointStatus"]
+                creating = False
+            else:
+                time.sleep(30)
 
 
 def get_manifest_lines(
@@ -76,6 +83,15 @@ def get_manifest_lines(
     return lines
 
 
+def find_mask_attribute(line: dict, image_attribute: str) -> str:
+    """Picks the first `*-ref` attribute other than the image, as written by
+    Ground Truth semantic segmentation jobs"""
+    for attribute in line:
+        if attribute.endswith('-ref') and attribute != image_attribute:
+            return attribute
+    raise KeyError(f'No mask attribute found in manifest line: {line}')
+
+
 def write_lines_to_manifest(
     s3_client,
     lines,
@@ -0,0 +1,221 @@
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+
+_hooks = []
+
+
+class IOEvent:
+    """Timing and volume of one instrumented call, passed to every hook"""
+    __slots__ = ('operation', 'seconds', 'bytes', 'requests', 'retries', 'error')
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.seconds = 0.0
+        self.bytes = 0
+        self.requests = 0
+        self.retries = 0
+        self.error = None
+
+    def add_response(self, response: dict):
+        """Counts a botocore response and the retries it reports"""
+        self.requests += 1
+        self.retries += response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+
+    def __repr__(self):
+        return (f'IOEvent({self.operation!r}, seconds={self.seconds:.4f}, bytes={self.bytes}, '
+                f'requests={self.requests}, retries={self.retries}, error={self.error!r})')
+
+
+class _Tracker:
+    __slots__ = ('event', 'start')
+
+    def __init__(self, operation: str):
+        self.event = IOEvent(operation)
+
+    def __enter__(self) -> IOEvent:
+        self.start = time.perf_counter()
+        return self.event
+
+    def __exit__(self, exc_type, exc, tb):
+        self.event.seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.event.error = exc_type.__name__
+        for hook in list(_hooks):
+            hook(self.event)
+        return False
+
+
+class _NullEvent:
+    """Stand-in returned while no hooks are registered; ignores all updates"""
+    __slots__ = ()
+    operation = None
+    seconds = 0.0
+    bytes = 0
+    requests = 0
+    retries = 0
+    error = None
+
+    def __setattr__(self, name, value):
+        pass
+
+    def add_response(self, response: dict):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_EVENT = _NullEvent()
+
+
+def track(operation: str):
+    """Context manager timing `operation` and handing an IOEvent to the hooks.
+
+    Costs a single list check while no hooks are registered.
+
+        with track('s3.read') as event:
+            data = ...
+            event.bytes = len(data)
+    """
+    if not _hooks:
+        return _NULL_EVENT
+    return _Tracker(operation)
+
+
+def add_hook(hook: Callable[[IOEvent], None]) -> Callable[[IOEvent], None]:
+    """Registers a callable that receives an IOEvent after every instrumented call"""
+    if hook not in _hooks:
+        _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: Callable[[IOEvent], None]) -> None:
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+class MetricsRegistry:
+    """Thread-safe per-operation totals and latency percentiles.
+
+    Parameters
+    ----------
+    max_samples : int, default 10000
+        Latencies kept per operation for percentiles.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __call__(self, event: IOEvent) -> None:
+        with self._lock:
+            stats = self._stats.get(event.operation)
+            if stats is None:
+                stats = self._stats[event.operation] = {
+                    'calls': 0, 'errors': 0, 'seconds': 0.0, 'bytes': 0,
+                    'requests': 0, 'retries': 0, 'latencies': deque(maxlen=self.max_samples),
+                }
+            stats['calls'] += 1
+            stats['errors'] += event.error is not None
+            stats['seconds'] += event.seconds
+            stats['bytes'] += event.bytes
+            stats['requests'] += event.requests
+            stats['retries'] += event.retries
+            stats['latencies'].append(event.seconds)
+
+    def snapshot(self) -> dict:
+        """Returns the totals per operation with p50/p90/p99 latency in seconds"""
+        with self._lock:
+            result = {}
+            for operation, stats in self._stats.items():
+                latencies = sorted(stats['latencies'])
+                summary = {k: v for k, v in stats.items() if k != 'latencies'}
+                for q in (50, 90, 99):
+                    summary[f'p{q}'] = latencies[round(q / 100 * (len(latencies) - 1))]
+                result[operation] = summary
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+registry = MetricsRegistry()
+
+
+def enable(hook: Callable[[IOEvent], None] = registry) -> Callable[[IOEvent], None]:
+    """Starts recording, into the module level `registry` unless a hook is given"""
+    return add_hook(hook)
+
+
+def disable(hook: Callable[[IOEvent], None] = None) -> None:
+    """Stops recording into `hook`, or removes all hooks"""
+    if hook is None:
+        _hooks.clear()
+    else:
+        remove_hook(hook)
+
+
+class StatsDExporter:
+    """Hook sending each event to a StatsD daemon over UDP.
+
+    Emits `<prefix>.<operation>.latency` as a timer and `bytes`, `requests`,
+    `retries` and `errors` as counters.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 'smutils'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, event: IOEvent) -> None:
+        name = f'{self.prefix}.{event.operation}'
+        lines = [
+            f'{name}.latency:{event.seconds * 1000:.3f}|ms',
+            f'{name}.bytes:{event.bytes}|c',
+            f'{name}.requests:{event.requests}|c',
+            f'{name}.retries:{event.retries}|c',
+        ]
+        if event.error is not None:
+            lines.append(f'{name}.errors:1|c')
+        try:
+            self._socket.sendto('\n'.join(lines).encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+
+class OpenTelemetryExporter:
+    """Hook recording events as OpenTelemetry metrics, labelled by operation.
+
+    Parameters
+    ----------
+    meter : opentelemetry Meter, default None
+        Defaults to the global meter provider's `smUtils` meter.
+    """
+
+    def __init__(self, meter = None):
+        if meter is None:
+            from opentelemetry import metrics
+            meter = metrics.get_meter('smUtils')
+        self._duration = meter.create_histogram('smutils.io.duration', unit='s')
+        self._bytes = meter.create_counter('smutils.io.bytes', unit='By')
+        self._requests = meter.create_counter('smutils.io.requests')
+        self._retries = meter.create_counter('smutils.io.retries')
+        self._errors = meter.create_counter('smutils.io.errors')
+
+    def __call__(self, event: IOEvent) -> None:
+        attributes = {'operation': event.operation}
+        self._duration.record(event.seconds, attributes)
+        self._bytes.add(event.bytes, attributes)
+        self._requests.add(event.requests, attributes)
+        self._retries.add(event.retries, attributes)
+        if event.error is not None:
+            self._errors.add(1, dict(attributes, error=event.error))
@@ -0,0 +1,232 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterator, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .palette import palette as default_palette
+from .segmentUtils import overlay_mask
+
+
+ArraySource = Union[str, np.ndarray]
+
+_open_arrays = {}
+
+
+def open_array(source: ArraySource, mmap_mode: str = 'r') -> np.array:
+    """Returns `source` as an array without loading it into memory.
+
+    Parameters
+    ----------
+    source : str or Numpy Array,
+        Path to a .npy file, opened as a memory map, or an array already in
+        memory (including np.memmap), returned as is.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    if not str(source).endswith('.npy'):
+        raise ValueError(f'Expected a .npy file, convert images with image_to_npy first: {source}')
+    return np.load(source, mmap_mode=mmap_mode)
+
+
+def _open_cached(source: ArraySource, mmap_mode: str = 'r') -> np.array:
+    """open_array, keeping memory maps open for the duration of one map_tiles call"""
+    if isinstance(source, np.ndarray):
+        return source
+    key = (source, mmap_mode)
+    if key not in _open_arrays:
+        _open_arrays[key] = open_array(source, mmap_mode)
+    return _open_arrays[key]
+
+
+def image_to_npy(image_path: str, npy_path: str) -> np.array:
+    """Converts an image file to a .npy file that can be memory mapped.
+
+    The image is decoded once by PIL, so this step still needs memory for
+    the full image; every later tiled pass only pages in the tiles it reads.
+    """
+    max_pixels, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+    try:
+        with Image.open(image_path) as image:
+            arr = np.asarray(image)
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+
+    out = np.lib.format.open_memmap(npy_path, mode='w+', dtype=arr.dtype, shape=arr.shape)
+    out[:] = arr
+    out.flush()
+    return open_array(npy_path)
+
+
+def iter_tiles(
+    shape: Sequence[int],
+    tile_size: int = 2048,
+) -> Iterator[Tuple[slice, slice]]:
+    """Yields (rows, cols) slices covering a 2D `shape` in row-major tile order"""
+    height, width = shape[:2]
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            yield slice(y, min(y + tile_size, height)), slice(x, min(x + tile_size, width))
+
+
+def _run_tile(func: Callable, sources: Sequence[ArraySource], window: Tuple[slice, slice]):
+    tiles = [_open_cached(source)[window] for source in sources]
+    return func(window, *tiles)
+
+
+def map_tiles(
+    func: Callable,
+    sources: Sequence[ArraySource],
+    tile_size: int = 2048,
+    max_workers: int = None,
+    use_processes: bool = None,
+) -> list:
+    """Calls `func(window, *tiles)` for every tile of same-sized sources.
+
+    Only one tile per source and worker is in memory at a time.
+
+    Parameters
+    ----------
+    func : Callable,
+        Receives the (rows, cols) window and the matching tile of each
+        source. Must be a module level function (or partial of one) when
+        run in processes.
+
+    sources : Sequence[str or Numpy Array],
+        .npy paths or arrays sharing the same height and width.
+
+    max_workers : int, default None
+        Pool size, os.cpu_count() when None. 1 runs sequentially.
+
+    use_processes : bool, default None
+        Run tiles on a process pool. Defaults to True when every source is a
+        .npy path, since workers then reopen the memory maps instead of
+        receiving pickled arrays.
+
+    Returns
+    -------
+    List of `func` results in tile order.
+    """
+    shape = open_array(sources[0]).shape
+    windows = list(iter_tiles(shape, tile_size))
+    run = partial(_run_tile, func, sources)
+
+    try:
+        if max_workers == 1:
+            return [run(window) for window in windows]
+        if use_processes is None:
+            use_processes = all(isinstance(source, str) for source in sources)
+
+        if use_processes:
+            # Forked workers must not inherit maps from an earlier call, whose files may have been replaced
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_open_arrays.clear)
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        with executor:
+            return list(executor.map(run, windows))
+    finally:
+        _open_arrays.clear()
+
+
+def confusion_matrix(y_true: np.array, y_pred: np.array, num_classes: int) -> np.array:
+    """Pixel confusion matrix indexed [true][predicted], via a single bincount"""
+    index = y_true.astype(np.int64).ravel() * num_classes + y_pred.astype(np.int64).ravel()
+    return np.bincount(index, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
+
+def _confusion_tile(window, y_true, y_pred, num_classes):
+    return confusion_matrix(y_true, y_pred, num_classes)
+
+
+def tiled_confusion_matrix(
+    y_true: ArraySource,
+    y_pred: ArraySource,
+    num_classes: int,
+    tile_size: int = 2048,
+    max_workers: int = None,
+) -> np.array:
+    """Confusion matrix of two large masks, summed exactly over tiles.
+
+    Parameters
+    ----------
+    y_true, y_pred : str or Numpy Array,
+        .npy paths or arrays of integer class ids below `num_classes`.
+    """
+    func = partial(_confusion_tile, num_classes=num_classes)
+    return sum(map_tiles(func, [y_true, y_pred], tile_size, max_workers))
+
+
+def iou_from_confusion_matrix(cm: np.array) -> Tuple[np.array, float]:
+    """Per-class IoU and their mean over classes present in either mask,
+    matching get_multiclass_iou on the full arrays"""
+    intersection = np.diag(cm).astype(np.float64)
+    union = cm.sum(axis=0) + cm.sum(axis=1) - intersection
+    present = union > 0
+    ious = np.divide(intersection, union, out=np.ones_like(intersection), where=present)
+    return ious, float(ious[present].mean()) if present.any() else 1.0
+
+
+def dice_from_confusion_matrix(cm: np.array) -> Tuple[np.array, float]:
+    """Per-class Dice and their mean over classes present in either mask,
+    matching get_multiclass_dice on the full arrays"""
+    intersection = np.diag(cm).astype(np.float64)
+    total = cm.sum(axis=0) + cm.sum(axis=1)
+    present = total > 0
+    dices = np.divide(2 * intersection, total, out=np.ones_like(intersection), where=present)
+    return dices, float(dices[present].mean()) if present.any() else 1.0
+
+
+def _unique_tile(window, mask):
+    return np.unique(mask)
+
+
+def _overlay_tile(window, image, mask, out_path, num_segments, alpha, palette):
+    segment = Image.fromarray(np.ascontiguousarray(mask), mode='P')
+    segment.putpalette(palette[:num_segments*3])
+    overlay = overlay_mask(Image.fromarray(np.ascontiguousarray(image)), segment, alpha)
+    _open_cached(out_path, 'r+')[window] = np.asarray(overlay)
+
+
+def tiled_overlay(
+    image: ArraySource,
+    mask: ArraySource,
+    out_path: str,
+    alpha: int = 127,
+    palette: Sequence[int] = default_palette,
+    tile_size: int = 2048,
+    max_workers: int = None,
+) -> np.array:
+    """overlay_mask for images too large to hold in memory.
+
+    Colors match mask_array_to_image + overlay_mask on the full arrays: the
+    palette is cut to the number of distinct mask values in the whole mask.
+
+    Parameters
+    ----------
+    image : str or Numpy Array,
+        (height, width[, 3]) uint8 image, .npy path or array.
+
+    mask : str or Numpy Array,
+        (height, width) uint8 mask, .npy path or array.
+
+    out_path : str,
+        .npy file the (height, width, 3) RGB overlay is written to.
+
+    Returns
+    -------
+    The overlay, memory mapped from `out_path`.
+    """
+    height, width = open_array(mask).shape[:2]
+    num_segments = len(np.unique(np.concatenate(map_tiles(_unique_tile, [mask], tile_size, max_workers))))
+
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.uint8, shape=(height, width, 3))
+    del out
+
+    func = partial(
+        _overlay_tile, out_path=os.path.abspath(out_path),
+        num_segments=num_segments, alpha=alpha, palette=list(palette),
+    )
+    map_tiles(func, [image, mask], tile_size, max_workers)
+    return open_array(out_path)